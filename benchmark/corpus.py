@@ -0,0 +1,169 @@
+# Generatore deterministico di contenitori e payload sintetici per benchmark e stress test.
+# Lo stesso seed produce sempre gli stessi pixel e gli stessi byte, quindi due esecuzioni
+# (o due versioni del programma) lavorano esattamente sugli stessi dati.
+#
+# Uso: python benchmark/corpus.py OUTDIR [--seed S] [--max-megapixels MP]
+import argparse
+import os
+import sys
+import zlib
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from funzioni.probe import (TEXT_TERMINATOR_BITS, TEXT_CHECKSUM_BITS, IMAGE_METADATA_HEADER_MAX_BITS,
+                            FILE_METADATA_HEADER_MAX_BITS)
+
+CARRIER_KINDS = ("gradient", "noise", "texture", "flat")
+# Modalità accettate dai contenitori: tutte vengono convertite in RGB prima dell'occultamento
+CARRIER_MODES = ("RGB", "RGBA", "L", "LA", "P")
+# Dimensioni (larghezza, altezza) in ordine crescente; --max-megapixels decide fin dove arrivare
+CARRIER_SIZES = ((64, 48), (320, 240), (640, 480), (1920, 1080), (4000, 3000), (10000, 10000))
+PAYLOAD_KINDS = ("empty", "one-byte", "random", "compressible", "capacity-edge")
+# Caratteri dei messaggi di testo: ASCII stampabile e qualche carattere UTF-8 a più byte
+TEXT_ALPHABET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,;:!?\n" + "àèéìòù€ß"
+
+def sizes_up_to(max_megapixels: float) -> list:
+    """Dimensioni di CARRIER_SIZES con al massimo max_megapixels milioni di pixel."""
+    return [(w, h) for w, h in CARRIER_SIZES if w * h <= max_megapixels * 1_000_000]
+
+def _rng(seed: int, *labels) -> np.random.Generator:
+    """Generatore indipendente per ogni combinazione di seed ed etichette."""
+    return np.random.default_rng([seed] + [zlib.crc32(str(label).encode()) for label in labels])
+
+def _texture_channel(rng: np.random.Generator, width: int, height: int) -> np.ndarray:
+    """
+    Canale simile a una fotografia: rumore a bassa risoluzione ingrandito (tre ottave,
+    bicubico) più una grana fine. Gli accumuli sono uint16 per limitare la memoria a 100 MP.
+    """
+    acc = np.zeros((height, width), dtype=np.uint16)
+    for cell, weight in ((256, 4), (48, 2), (8, 1)):
+        small = rng.integers(0, 256, (max(2, height // cell), max(2, width // cell)), dtype=np.uint8)
+        layer = np.asarray(Image.fromarray(small).resize((width, height), Image.BICUBIC))
+        acc += layer.astype(np.uint16) * weight
+    acc //= 7
+    acc += rng.integers(0, 9, (height, width), dtype=np.uint8)
+    # Grana centrata in zero: -4..+4 senza uscire da 0..255
+    np.maximum(acc, 4, out=acc)
+    acc -= 4
+    np.minimum(acc, 255, out=acc)
+    return acc.astype(np.uint8)
+
+def make_carrier(kind: str, width: int, height: int, mode: str = "RGB", seed: int = 0) -> Image.Image:
+    """
+    Crea un contenitore deterministico.
+    kind: 'gradient' (sfumature lisce), 'noise' (pixel casuali uniformi),
+    'texture' (simile a una foto) o 'flat' (colore unico, il caso più comprimibile).
+    """
+    if kind == "gradient":
+        # Sfumature lineari e radiale a 256 livelli, ingrandite alla dimensione richiesta
+        channels = (Image.linear_gradient("L"), Image.linear_gradient("L").rotate(90), Image.radial_gradient("L"))
+        img = Image.merge("RGB", [c.resize((width, height), Image.BILINEAR) for c in channels])
+    elif kind == "noise":
+        rng = _rng(seed, kind, width, height)
+        img = Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+    elif kind == "texture":
+        rng = _rng(seed, kind, width, height)
+        img = Image.merge("RGB", [Image.fromarray(_texture_channel(rng, width, height)) for _ in range(3)])
+    elif kind == "flat":
+        color = tuple(int(v) for v in _rng(seed, kind).integers(0, 256, 3))
+        img = Image.new("RGB", (width, height), color)
+    else:
+        raise ValueError(f"Tipo di contenitore sconosciuto: {kind}")
+    return img if mode == "RGB" else img.convert(mode)
+
+def text_capacity(width: int, height: int) -> int:
+    """Caratteri ASCII che text_in_image può nascondere (terminatore e checksum esclusi)."""
+    return max(width * height * 3 - TEXT_TERMINATOR_BITS - TEXT_CHECKSUM_BITS, 0) // 8
+
+def file_capacity(width: int, height: int) -> int:
+    """Byte che file_in_image può nascondere (header dei metadati escluso)."""
+    return max(width * height * 3 - FILE_METADATA_HEADER_MAX_BITS, 0) // 8
+
+def image_capacity(width: int, height: int, lsb: int, msb: int) -> int:
+    """Pixel segreti che image_in_image accetta con i parametri dati (come fits_in_container)."""
+    groups = max(width * height * 3 - IMAGE_METADATA_HEADER_MAX_BITS, 0) // 3
+    return groups * lsb // msb
+
+def make_payload(kind: str, size: int, seed: int = 0) -> bytes:
+    """
+    Payload binario deterministico per file_in_image.
+    'empty' e 'one-byte' ignorano size; 'random' e 'capacity-edge' sono byte casuali,
+    'compressible' è un breve motivo ripetuto.
+    """
+    if kind == "empty":
+        return b""
+    if kind == "one-byte":
+        return bytes([int(_rng(seed, kind).integers(0, 256))])
+    if kind in ("random", "capacity-edge"):
+        return _rng(seed, kind, size).bytes(size)
+    if kind == "compressible":
+        return (b"steganografia " * (size // 14 + 1))[:size]
+    raise ValueError(f"Tipo di payload sconosciuto: {kind}")
+
+def make_text(kind: str, length: int, seed: int = 0) -> str:
+    """
+    Messaggio deterministico per text_in_image, senza caratteri nulli.
+    'capacity-edge' usa solo ASCII, così length caratteri occupano esattamente length byte.
+    """
+    if kind == "empty":
+        return ""
+    if kind == "one-byte":
+        return "x"
+    if kind == "compressible":
+        return ("ciao " * (length // 5 + 1))[:length]
+    rng = _rng(seed, kind, length)
+    alphabet = TEXT_ALPHABET[:-8] if kind == "capacity-edge" else TEXT_ALPHABET
+    return "".join(alphabet[i] for i in rng.integers(0, len(alphabet), length))
+
+def make_secret_image(kind: str, width: int, height: int, seed: int = 0) -> Image.Image:
+    """
+    Immagine segreta RGB per image_in_image: 'one-byte' è un solo pixel, 'compressible' un
+    colore unico, 'random' e 'capacity-edge' rumore uniforme (il caso peggiore per la verifica).
+    """
+    if kind == "one-byte":
+        width = height = 1
+    if kind == "compressible":
+        return make_carrier("flat", width, height, seed=seed)
+    if kind in ("random", "capacity-edge", "one-byte"):
+        return make_carrier("noise", width, height, seed=seed + 1)
+    raise ValueError(f"Tipo di immagine segreta non valido: {kind}")
+
+def write_corpus(output_dir: str, seed: int = 0, max_megapixels: float = 2) -> list:
+    """
+    Scrive su disco tutti i contenitori (ogni tipo, dimensione e modalità) e i payload
+    binari per ciascuna dimensione. Restituisce i percorsi creati.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for width, height in sizes_up_to(max_megapixels):
+        for kind in CARRIER_KINDS:
+            for mode in CARRIER_MODES:
+                path = os.path.join(output_dir, f"carrier_{kind}_{width}x{height}_{mode}.png")
+                make_carrier(kind, width, height, mode, seed).save(path)
+                paths.append(path)
+        for kind in PAYLOAD_KINDS:
+            size = file_capacity(width, height) if kind == "capacity-edge" else file_capacity(width, height) // 10
+            path = os.path.join(output_dir, f"payload_{kind}_{width}x{height}.bin")
+            with open(path, "wb") as f:
+                f.write(make_payload(kind, size, seed))
+            paths.append(path)
+    return paths
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Genera un corpus sintetico deterministico.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-megapixels", type=float, default=2,
+                        help="dimensione massima dei contenitori (fino a 100, default %(default)s)")
+    args = parser.parse_args()
+
+    paths = write_corpus(args.output_dir, args.seed, args.max_megapixels)
+    print(f"{len(paths)} file scritti in '{args.output_dir}'.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# Benchmark della memoria di picco delle operazioni di occultamento e recupero.
+# Ogni operazione gira in un processo nuovo e vengono controllati due limiti, in multipli
+# della dimensione grezza del contenitore (larghezza x altezza x 3):
+#   - picco di tracemalloc (array NumPy e oggetti Python del progetto):
+#     --budget x grezza + TRACED_ALLOWANCE;
+#   - aumento del picco RSS dell'intero processo (solo Linux):
+#     (--budget + PIL_DECODE_RATIO) x grezza + RSS_ALLOWANCE.
+# Il secondo limite è più alto perché PIL decodifica sempre l'intera immagine nella propria
+# memoria (4 byte per pixel RGB) prima che venga copiata nel buffer del contenitore: durante
+# la decodifica esistono quindi due copie dei pixel, non una. Esce con codice 1 se un limite
+# è superato.
+#
+# Uso: python benchmark/memory.py [--width W] [--height H] [--budget 1.3]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOBS = ("hide-file", "recover-file", "hide-image", "recover-image", "hide-messages")
+DEFAULT_BUDGET = 1.3
+# Costi fissi che non crescono con l'immagine: stato di zlib per la compressione (~270 KB),
+# buffer di lettura del file di PIL, temporanei dell'interprete.
+TRACED_ALLOWANCE = 1 << 20
+# Copia decodificata di PIL: 4 byte per pixel contro i 3 del buffer.
+PIL_DECODE_RATIO = 4 / 3
+# Costi fissi dell'RSS: arene dell'allocatore, librerie caricate alla prima decodifica.
+RSS_ALLOWANCE = 8 << 20
+
+def _make_inputs(tmp: str, width: int, height: int) -> dict:
+    """Crea contenitore, immagine segreta (1/16 dei pixel) e file segreto (5% della capacità)."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 / width, y * 255 / height, (x + y) * 255 / (width + height)], axis=-1)
+    carrier = np.clip(base + rng.normal(0, 4, base.shape), 0, 255).astype(np.uint8)
+    paths = {name: os.path.join(tmp, name) for name in ("carrier.png", "secret.png", "secret.bin")}
+    Image.fromarray(carrier).save(paths["carrier.png"])
+    Image.fromarray(carrier[::4, ::4].copy()).save(paths["secret.png"])
+    with open(paths["secret.bin"], "wb") as f:
+        f.write(rng.bytes(width * height * 3 // 8 // 20))
+    return paths
+
+def _peak_rss() -> int | None:
+    """Picco RSS del processo in byte (VmHWM, solo Linux), None se non disponibile."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def _reset_peak_rss():
+    """Azzera il picco RSS (Linux): il valore ereditato dal processo padre non conta."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def _run_job(job: str, tmp: str) -> dict:
+    """Esegue un'operazione misurando il picco di tracemalloc e di RSS (nel processo figlio)."""
+    import tracemalloc
+    from PIL import Image
+    from funzioni.file_in_image import hideFile, recoverFile
+    from funzioni.image_in_image import hideImage, getImage
+    from funzioni.multi_text_in_image import hideMessages
+
+    carrier = os.path.join(tmp, "carrier.png")
+    jobs = {
+        "hide-file": lambda: hideFile(carrier, os.path.join(tmp, "secret.bin"), os.path.join(tmp, "steg_file.png")),
+        "recover-file": lambda: recoverFile(os.path.join(tmp, "steg_file.png"), tmp),
+        "hide-image": lambda: hideImage(carrier, Image.open(os.path.join(tmp, "secret.png")),
+                                        os.path.join(tmp, "steg_img.png"), 2, 4),
+        "recover-image": lambda: getImage(Image.open(os.path.join(tmp, "steg_img.png")),
+                                          os.path.join(tmp, "recovered.png")),
+        "hide-messages": lambda: hideMessages(carrier, ["uno", "due", "tre"], os.path.join(tmp, "steg_multi.png")),
+    }
+    _reset_peak_rss()
+    rss_before = _peak_rss()
+    tracemalloc.start()
+    jobs[job]()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = _peak_rss()
+    rss_increase = rss_after - rss_before if rss_before is not None else None
+    return {"traced_peak": peak, "rss_increase": rss_increase}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Memoria di picco delle operazioni su immagini.")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="picco massimo in multipli della dimensione grezza (default %(default)s)")
+    parser.add_argument("--job", choices=JOBS, help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.job:
+        sys.path.insert(0, ROOT)
+        print(json.dumps(_run_job(args.job, args.dir)))
+        return 0
+
+    raw = args.width * args.height * 3
+    traced_limit = args.budget * raw + TRACED_ALLOWANCE
+    rss_limit = (args.budget + PIL_DECODE_RATIO) * raw + RSS_ALLOWANCE
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        _make_inputs(tmp, args.width, args.height)
+        print(f"Contenitore {args.width}x{args.height}: {raw / 2**20:.1f} MB grezzi; "
+              f"limiti: tracemalloc {traced_limit / raw:.2f}x, RSS +{rss_limit / raw:.2f}x")
+        for job in JOBS:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--job", job, "--dir", tmp],
+                                 cwd=ROOT, capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            over = result["traced_peak"] > traced_limit
+            if result["rss_increase"] is None:
+                rss = "n/d"
+            else:
+                rss = f"+{result['rss_increase'] / raw:.2f}x"
+                over = over or result["rss_increase"] > rss_limit
+            failed = failed or over
+            print(f"{job:<14} tracemalloc {result['traced_peak'] / raw:5.2f}x  RSS {rss:>6}  "
+                  f"{'FUORI BUDGET' if over else 'OK'}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# Benchmark del tempo di avvio dei comandi non interattivi.
+# Esegue più volte 'python main.py <comando>' in un processo nuovo e confronta
+# la mediana con il budget in millisecondi. Esce con codice 1 se il budget è superato.
+#
+# Uso: python benchmark/startup.py [--runs N] [--budget-ms MS]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budget per comando (ms): 'capacity' legge solo l'header, 'probe' importa PIL ma non NumPy.
+DEFAULT_BUDGETS_MS = {"capacity": 80, "probe": 200}
+
+def _make_carrier(path: str):
+    """Crea un PNG di prova 1920x1080."""
+    from PIL import Image
+    Image.new("RGB", (1920, 1080), (120, 130, 140)).save(path)
+
+def time_command(args: list, runs: int) -> list:
+    """Tempi in ms di 'python main.py args' eseguito runs volte."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, "main.py")] + args,
+                       cwd=ROOT, stdout=subprocess.DEVNULL, check=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del tempo di avvio dei comandi non interattivi.")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="budget per 'capacity' (default %d ms)" % DEFAULT_BUDGETS_MS["capacity"])
+    args = parser.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    if args.budget_ms is not None:
+        budgets["capacity"] = args.budget_ms
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        carrier = os.path.join(tmp, "carrier.png")
+        _make_carrier(carrier)
+        for command, budget in budgets.items():
+            timings = time_command([command, carrier], args.runs)
+            median = statistics.median(timings)
+            status = "OK" if median <= budget else "FUORI BUDGET"
+            failed = failed or median > budget
+            print(f"{command:<10} mediana {median:7.1f} ms  min {min(timings):7.1f} ms  budget {budget:.0f} ms  {status}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
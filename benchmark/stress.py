@@ -0,0 +1,319 @@
+# Stress test di andata e ritorno (occultamento + recupero) su un corpus sintetico.
+# Per ogni combinazione di formato (testo, immagine, file), contenitore (tipo, dimensione,
+# modalità) e payload (vuoto, 1 byte, casuale, comprimibile, al limite della capacità e
+# oltre) nasconde il contenuto, lo recupera e lo confronta con l'originale, in parallelo.
+# Il riepilogo JSON (--output) contiene esito e tempi di ogni caso e può essere
+# confrontato con quello di un'esecuzione precedente (--compare).
+# Esce con codice 1 se qualche caso fallisce o se il confronto rileva una regressione.
+#
+# Uso: python benchmark/stress.py [--max-megapixels MP] [--repeat N] [--processes P]
+#                                 [--formats text,image,file] [--only TESTO]
+#                                 [--output riepilogo.json] [--compare precedente.json]
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+# corpus aggiunge la radice del progetto a sys.path
+from corpus import (CARRIER_KINDS, CARRIER_MODES, PAYLOAD_KINDS, sizes_up_to, make_carrier, make_payload,
+                    make_text, make_secret_image, text_capacity, file_capacity, image_capacity)
+from utility import save_image_atomic
+from funzioni.text_in_image import hideMessage, getMessage
+from funzioni.image_in_image import hideImage, getImage
+from funzioni.file_in_image import hideFile, recoverFile
+
+FORMATS = ("text", "image", "file")
+# Coppie (lsb, msb) provate per image_in_image: minima distorsione, predefinita, più bit e msb pieno
+IMAGE_PARAMS = ((1, 1), (2, 4), (4, 4), (1, 8))
+# Oltre ai payload del corpus: un byte (o una riga di pixel) oltre la capacità, da rifiutare
+OVER_CAPACITY = "over-capacity"
+SUMMARY_VERSION = 1
+# Rapporto massimo tra le mediane dei tempi (nuovo / precedente) prima di segnalare una regressione
+DEFAULT_TOLERANCE = 1.25
+
+def build_cases(formats, max_megapixels: float, repeat: int = 1, seed: int = 0) -> list:
+    """
+    Elenco deterministico dei casi: ogni caso è un dizionario serializzabile con un id
+    stabile, così i riepiloghi di esecuzioni diverse si possono confrontare caso per caso.
+    """
+    cases = []
+    for r in range(repeat):
+        for fmt in formats:
+            for width, height in sizes_up_to(max_megapixels):
+                for kind in CARRIER_KINDS:
+                    for mode in CARRIER_MODES:
+                        for payload in PAYLOAD_KINDS + (OVER_CAPACITY,):
+                            # Un'immagine segreta vuota non esiste
+                            if fmt == "image" and payload == "empty":
+                                continue
+                            for lsb, msb in (IMAGE_PARAMS if fmt == "image" else ((None, None),)):
+                                params = f"/lsb{lsb}-msb{msb}" if fmt == "image" else ""
+                                cases.append({
+                                    "id": f"{fmt}/{kind}-{width}x{height}-{mode}/{payload}{params}/r{r}",
+                                    "format": fmt, "carrier": [kind, width, height, mode],
+                                    "payload": payload, "lsb": lsb, "msb": msb, "seed": seed + r,
+                                    "expect": "rejected" if payload == OVER_CAPACITY else "ok",
+                                })
+    return cases
+
+def _carrier_path(work_dir: str, case: dict) -> str:
+    """Contenitore del caso, generato una volta sola e condiviso tra i processi."""
+    kind, width, height, mode = case["carrier"]
+    path = os.path.join(work_dir, f"carrier_{kind}_{width}x{height}_{mode}_s{case['seed']}.png")
+    if not os.path.exists(path):
+        # Salvataggio atomico: due processi possono generarlo insieme senza file parziali
+        save_image_atomic(make_carrier(kind, width, height, mode, case["seed"]), path)
+    return path
+
+def _payload_size(capacity: int, payload: str) -> int:
+    """Dimensione del payload: il 10% della capacità, la capacità esatta o un'unità in più."""
+    if payload == "capacity-edge":
+        return capacity
+    if payload == OVER_CAPACITY:
+        return capacity + 1
+    return max(1, capacity // 10)
+
+def _run_text(case: dict, carrier: str, out_dir: str) -> dict:
+    _, width, height, _ = case["carrier"]
+    kind = "capacity-edge" if case["payload"] == OVER_CAPACITY else case["payload"]
+    message = make_text(kind, _payload_size(text_capacity(width, height), case["payload"]), case["seed"])
+    output = os.path.join(out_dir, "steg.png")
+    # Le funzioni di testo stampano esito ed errori: non servono nel riepilogo
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        start = time.perf_counter()
+        hidden = hideMessage(carrier, message, output)
+        hide_s = time.perf_counter() - start
+        if not hidden:
+            return {"rejected": True, "hide_s": hide_s, "error": log.getvalue().strip()}
+        start = time.perf_counter()
+        recovered = getMessage(output)
+        recover_s = time.perf_counter() - start
+    # Un messaggio vuoto non si distingue da un'immagine senza messaggio: getMessage restituisce None
+    expected = message or None
+    return {"rejected": False, "hide_s": hide_s, "recover_s": recover_s, "match": recovered == expected,
+            "payload_bytes": len(message.encode("utf-8"))}
+
+def _run_file(case: dict, carrier: str, out_dir: str) -> dict:
+    _, width, height, _ = case["carrier"]
+    kind = "capacity-edge" if case["payload"] == OVER_CAPACITY else case["payload"]
+    data = make_payload(kind, _payload_size(file_capacity(width, height), case["payload"]), case["seed"])
+    secret = os.path.join(out_dir, "payload.bin")
+    with open(secret, "wb") as f:
+        f.write(data)
+    output = os.path.join(out_dir, "steg.png")
+    start = time.perf_counter()
+    try:
+        hideFile(carrier, secret, output)
+    except ValueError as e:
+        return {"rejected": True, "hide_s": time.perf_counter() - start, "error": str(e)}
+    hide_s = time.perf_counter() - start
+    start = time.perf_counter()
+    recovered = recoverFile(output, out_dir)
+    recover_s = time.perf_counter() - start
+    with open(recovered, "rb") as f:
+        match = f.read() == data
+    return {"rejected": False, "hide_s": hide_s, "recover_s": recover_s, "match": match, "payload_bytes": len(data)}
+
+def _secret_size(width: int, height: int, pixels: int, payload: str) -> tuple:
+    """Dimensioni dell'immagine segreta: con le proporzioni del contenitore, o al limite esatto."""
+    if payload in ("capacity-edge", OVER_CAPACITY):
+        secret_width = min(pixels, width)
+        # Una riga in più basta a superare la capacità
+        return secret_width, pixels // secret_width + (payload == OVER_CAPACITY)
+    pixels = max(1, pixels // 4)
+    secret_width = max(1, min(pixels, int(width * (pixels / (width * height)) ** 0.5)))
+    return secret_width, max(1, pixels // secret_width)
+
+def _run_image(case: dict, carrier: str, out_dir: str) -> dict:
+    _, width, height, _ = case["carrier"]
+    lsb, msb = case["lsb"], case["msb"]
+    kind = "capacity-edge" if case["payload"] == OVER_CAPACITY else case["payload"]
+    size = _secret_size(width, height, image_capacity(width, height, lsb, msb), case["payload"])
+    secret = make_secret_image(kind, *size, seed=case["seed"])
+    output = os.path.join(out_dir, "steg.png")
+    start = time.perf_counter()
+    try:
+        hideImage(carrier, secret, output, lsb, msb)
+    except ValueError as e:
+        return {"rejected": True, "hide_s": time.perf_counter() - start, "error": str(e)}
+    hide_s = time.perf_counter() - start
+    start = time.perf_counter()
+    with Image.open(output) as steg:
+        recovered = getImage(steg, os.path.join(out_dir, "recovered.png"))
+    recover_s = time.perf_counter() - start
+    # Vengono nascosti solo i msb bit più significativi di ogni canale
+    secret_mask = 0xFF ^ ((1 << (8 - msb)) - 1)
+    match = np.array_equal(np.asarray(recovered), np.asarray(secret) & secret_mask)
+    return {"rejected": False, "hide_s": hide_s, "recover_s": recover_s, "match": match,
+            "payload_bytes": secret.width * secret.height * 3}
+
+RUNNERS = {"text": _run_text, "image": _run_image, "file": _run_file}
+
+def run_case(case: dict, work_dir: str) -> dict:
+    """
+    Esegue un caso e restituisce id, stato ('ok', 'failed' o 'error'), tempi in ms e,
+    per i casi non riusciti, il motivo.
+    """
+    result = {"id": case["id"], "format": case["format"], "status": "ok"}
+    out_dir = tempfile.mkdtemp(dir=work_dir)
+    try:
+        outcome = RUNNERS[case["format"]](case, _carrier_path(work_dir, case), out_dir)
+    except Exception as e:
+        result.update(status="error", reason=f"{type(e).__name__}: {e}")
+        return result
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    result["hide_ms"] = round(outcome["hide_s"] * 1000, 3)
+    if not outcome["rejected"]:
+        result["recover_ms"] = round(outcome["recover_s"] * 1000, 3)
+        result["payload_bytes"] = outcome["payload_bytes"]
+
+    if case["expect"] == "rejected" and not outcome["rejected"]:
+        result.update(status="failed", reason="payload oltre la capacità accettato")
+    elif case["expect"] == "ok" and outcome["rejected"]:
+        result.update(status="failed", reason=f"payload rifiutato: {outcome['error']}")
+    elif not outcome["rejected"] and not outcome["match"]:
+        result.update(status="failed", reason="il contenuto recuperato non corrisponde")
+    return result
+
+def _percentile(values: list, q: float) -> float | None:
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+def summarize(results: list, config: dict, elapsed_s: float) -> dict:
+    """Riepilogo per formato (casi, fallimenti, mediana e 95° percentile dei tempi, throughput)."""
+    totals = {}
+    for fmt in sorted({r["format"] for r in results}):
+        rows = [r for r in results if r["format"] == fmt]
+        hide = [r["hide_ms"] for r in rows if "hide_ms" in r]
+        recover = [r["recover_ms"] for r in rows if "recover_ms" in r]
+        payload = sum(r.get("payload_bytes", 0) for r in rows)
+        busy_s = (sum(hide) + sum(recover)) / 1000
+        totals[fmt] = {
+            "cases": len(rows),
+            "failed": sum(r["status"] != "ok" for r in rows),
+            "hide_ms_median": _percentile(hide, 50), "hide_ms_p95": _percentile(hide, 95),
+            "recover_ms_median": _percentile(recover, 50), "recover_ms_p95": _percentile(recover, 95),
+            "mb_per_s": round(payload / 2**20 / busy_s, 3) if busy_s else None,
+        }
+    return {
+        "version": SUMMARY_VERSION,
+        "config": config,
+        "platform": {"python": platform.python_version(), "numpy": np.__version__,
+                     "pillow": Image.__version__, "cpus": os.cpu_count()},
+        "elapsed_s": round(elapsed_s, 3),
+        "totals": totals,
+        "failures": [r for r in results if r["status"] != "ok"],
+        "cases": {r["id"]: {k: v for k, v in r.items() if k not in ("id", "format")} for r in results},
+    }
+
+def format_summary(summary: dict) -> str:
+    lines = [f"{'formato':<8} {'casi':>6} {'falliti':>8} {'occ. mediana':>13} {'occ. p95':>10} "
+             f"{'rec. mediana':>13} {'rec. p95':>10} {'MB/s':>8}"]
+    for fmt, t in summary["totals"].items():
+        cells = [t["hide_ms_median"], t["hide_ms_p95"], t["recover_ms_median"], t["recover_ms_p95"]]
+        hide_med, hide_p95, rec_med, rec_p95 = ("n/d" if v is None else f"{v:.1f} ms" for v in cells)
+        mbs = "n/d" if t["mb_per_s"] is None else f"{t['mb_per_s']:.2f}"
+        lines.append(f"{fmt:<8} {t['cases']:>6} {t['failed']:>8} {hide_med:>13} {hide_p95:>10} "
+                     f"{rec_med:>13} {rec_p95:>10} {mbs:>8}")
+    for failure in summary["failures"]:
+        lines.append(f"  {failure['status'].upper()} {failure['id']}: {failure['reason']}")
+    lines.append(f"Tempo totale: {summary['elapsed_s']:.1f} s")
+    return "\n".join(lines)
+
+def compare_summaries(old: dict, new: dict, tolerance: float = DEFAULT_TOLERANCE) -> tuple:
+    """
+    Confronta due riepiloghi: casi che ora falliscono (o non esistono più), casi risolti e
+    rapporto tra le mediane dei tempi per formato. Restituisce (righe di testo, regressione).
+    """
+    lines = []
+    old_cases, new_cases = old["cases"], new["cases"]
+    broken = sorted(i for i, r in new_cases.items() if r["status"] != "ok" and old_cases.get(i, {}).get("status") == "ok")
+    fixed = sorted(i for i, r in new_cases.items() if r["status"] == "ok" and old_cases.get(i, {}).get("status", "ok") != "ok")
+    common = len(old_cases.keys() & new_cases.keys())
+    lines.append(f"Casi in comune: {common} (precedente {len(old_cases)}, attuale {len(new_cases)})")
+    for case_id in broken:
+        lines.append(f"  NUOVO FALLIMENTO {case_id}: {new_cases[case_id]['reason']}")
+    for case_id in fixed:
+        lines.append(f"  RISOLTO {case_id}")
+    regressed = bool(broken)
+
+    for fmt, t in new["totals"].items():
+        before = old["totals"].get(fmt)
+        if before is None:
+            continue
+        for key in ("hide_ms_median", "recover_ms_median"):
+            if not before[key] or t[key] is None:
+                continue
+            ratio = t[key] / before[key]
+            slower = ratio > tolerance
+            regressed = regressed or slower
+            label = "occultamento" if key.startswith("hide") else "recupero"
+            lines.append(f"{fmt:<6} {label:<13} {before[key]:9.1f} ms -> {t[key]:9.1f} ms  "
+                         f"x{ratio:.2f}{'  PIÙ LENTO' if slower else ''}")
+    return lines, regressed
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stress test di andata e ritorno su un corpus sintetico.")
+    parser.add_argument("--formats", default=",".join(FORMATS),
+                        help="formati separati da virgola (default %(default)s)")
+    parser.add_argument("--max-megapixels", type=float, default=0.5,
+                        help="dimensione massima dei contenitori (fino a 100, default %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="ripetizioni con seed diversi (default 1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None, help="processi (default: tutti i core)")
+    parser.add_argument("--only", default=None, help="esegue solo i casi il cui id contiene questo testo")
+    parser.add_argument("--output", default=None, help="file JSON in cui scrivere il riepilogo")
+    parser.add_argument("--compare", default=None, help="riepilogo JSON di un'esecuzione precedente")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="rapporto massimo tra le mediane dei tempi (default %(default)s)")
+    args = parser.parse_args()
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"formati sconosciuti: {', '.join(sorted(unknown))}")
+    cases = build_cases(formats, args.max_megapixels, args.repeat, args.seed)
+    if args.only:
+        cases = [c for c in cases if args.only in c["id"]]
+    if not cases:
+        parser.error("nessun caso da eseguire")
+    config = {"formats": formats, "max_megapixels": args.max_megapixels, "repeat": args.repeat,
+              "seed": args.seed, "only": args.only}
+
+    print(f"{len(cases)} casi su {args.processes or os.cpu_count()} processi...")
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as work_dir:
+        run = partial(run_case, work_dir=work_dir)
+        if args.processes == 1:
+            results = [run(case) for case in cases]
+        else:
+            with ProcessPoolExecutor(max_workers=args.processes) as pool:
+                results = list(pool.map(run, cases, chunksize=max(1, len(cases) // 256)))
+    summary = summarize(results, config, time.perf_counter() - start)
+    print(format_summary(summary))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=1, ensure_ascii=False)
+    regressed = False
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            lines, regressed = compare_summaries(json.load(f), summary, args.tolerance)
+        print("\n".join(lines))
+
+    return 1 if summary["failures"] or regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+# Operazioni vettoriali sui piani di bit degli array NumPy delle immagini.
+# Tutti i bit sono ordinati dal più significativo, come format(byte, '08b').
+import numpy as np
+
+# Numero massimo di canali elaborati per blocco dalle operazioni con avanzamento.
+CHUNK_CHANNELS = 1 << 22
+# I blocchi non superano 1/CHUNK_CARRIER_FRACTION del contenitore (né scendono sotto
+# CHUNK_MIN_CHANNELS): i temporanei di un blocco restano una frazione fissa del buffer
+# anche con immagini piccole, dove 1 << 22 canali sarebbero metà dell'immagine.
+CHUNK_CARRIER_FRACTION = 256
+CHUNK_MIN_CHANNELS = 1 << 14
+
+def chunk_channels(carrier_channels: int, maximum: int = CHUNK_CHANNELS) -> int:
+    """Canali per blocco (multiplo di 24) per un contenitore di carrier_channels canali."""
+    size = min(maximum, max(CHUNK_MIN_CHANNELS, carrier_channels // CHUNK_CARRIER_FRACTION))
+    return max(24, size // 24 * 24)
+
+def bytes_to_bits(data) -> np.ndarray:
+    """Converte bytes (o un array uint8) in un array di bit 0/1 (MSB first)."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = np.frombuffer(data, dtype=np.uint8)
+    return np.unpackbits(data)
+
+def bits_to_bytes(bits: np.ndarray) -> bytes:
+    """Converte un array di bit 0/1 (MSB first) in bytes."""
+    return np.packbits(bits).tobytes()
+
+def embed_lsb(flat: np.ndarray, start: int, bits: np.ndarray):
+    """Scrive i bit nell'LSB dei canali flat[start:start+len(bits)] (in place)."""
+    region = flat[start:start + len(bits)]
+    np.bitwise_and(region, 0xFE, out=region)
+    np.bitwise_or(region, bits, out=region)
+
+def extract_lsb(flat: np.ndarray, start: int, count: int) -> np.ndarray:
+    """Legge l'LSB dei canali flat[start:start+count]."""
+    return flat[start:start + count] & 1
+
+def top_bits(values: np.ndarray, n: int) -> np.ndarray:
+    """Restituisce gli n bit più significativi di ogni valore uint8, concatenati."""
+    return np.unpackbits(values.reshape(-1, 1), axis=1)[:, :n].reshape(-1)
+
+def low_bits(values: np.ndarray, n: int) -> np.ndarray:
+    """Restituisce gli n bit meno significativi di ogni valore uint8, concatenati."""
+    return np.unpackbits(values.reshape(-1, 1), axis=1)[:, 8 - n:].reshape(-1)
+
+def bits_to_values(bits: np.ndarray, n: int, align_high: bool = False) -> np.ndarray:
+    """
+    Raggruppa i bit a n a n in valori uint8.
+    Con align_high=True i bit occupano le posizioni più significative (come ljust(8, '0')).
+    """
+    groups = bits.reshape(-1, n)
+    padded = np.zeros((groups.shape[0], 8), dtype=np.uint8)
+    if align_high:
+        padded[:, :n] = groups
+    else:
+        padded[:, 8 - n:] = groups
+    return np.packbits(padded, axis=1).reshape(-1)
@@ -0,0 +1,187 @@
+# Buffer unico dei pixel del contenitore, condiviso da occultamento, verifica e salvataggio.
+# L'immagine viene decodificata una volta e copiata, a strisce di righe, in un array RGB
+# contiguo e scrivibile; le funzioni lavorano sulle viste piatta e (h, w, 3) della stessa
+# memoria e il PNG viene scritto direttamente dall'array, senza passare da Image.fromarray().
+import os
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from utility import AtomicWriter, save_image_atomic
+
+# Byte elaborati per striscia durante la copia da PIL e la scrittura del PNG: al più
+# STRIP_BYTES e al più 1/STRIP_CARRIER_FRACTION del buffer (almeno una riga), così le
+# strisce restano trascurabili rispetto al buffer anche per immagini piccole.
+STRIP_BYTES = 1 << 20
+STRIP_CARRIER_FRACTION = 256
+# Compressione zlib del PNG. Z_FILTERED è la strategia di libpng per le righe filtrate;
+# con essa il livello 4 produce file pari o più piccoli del livello 6 di PIL sulle immagini
+# simili a foto (-5% su 24 MP) ed è più veloce.
+PNG_COMPRESS_LEVEL = 4
+PNG_COMPRESS_STRATEGY = zlib.Z_FILTERED
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Filtri di riga PNG, nell'ordine dei loro codici (0-4)
+PNG_FILTERS = ("None", "Sub", "Up", "Average", "Paeth")
+
+def _strip_rows(width: int, height: int) -> int:
+    """Righe per striscia per un'immagine RGB width x height."""
+    row_bytes = max(width * 3, 1)
+    return max(1, min(STRIP_BYTES, row_bytes * height // STRIP_CARRIER_FRACTION) // row_bytes)
+
+class CarrierBuffer:
+    """
+    Pixel RGB di un'immagine contenitore in un solo array uint8 (h, w, 3) contiguo e scrivibile.
+    `flat` e `hwc` sono viste della stessa memoria: le modifiche fatte tramite una
+    compaiono nell'altra e vengono salvate da save() senza copie intermedie.
+    """
+
+    def __init__(self, array: np.ndarray):
+        if array.dtype != np.uint8 or array.ndim != 3 or array.shape[2] != 3:
+            raise ValueError("Il buffer del contenitore deve essere un array uint8 (h, w, 3).")
+        if not array.flags.c_contiguous or not array.flags.writeable:
+            raise ValueError("Il buffer del contenitore deve essere contiguo e scrivibile.")
+        self._array = array
+
+    @classmethod
+    def from_image(cls, img: Image.Image, cancel_token=None) -> "CarrierBuffer":
+        """
+        Copia i pixel di un'immagine PIL nel buffer a strisce di righe: conversione RGB e
+        copie temporanee riguardano una striscia alla volta. La decodifica invece no: la prima
+        crop() fa decodificare a PIL l'intera immagine (4 byte per pixel RGB, fuori dal buffer),
+        e quella copia resta finché l'immagine non viene chiusa, come fa open().
+        cancel_token (un CancellationToken) viene controllato a ogni striscia.
+        """
+        width, height = img.size
+        array = np.empty((height, width, 3), dtype=np.uint8)
+        rows = _strip_rows(width, height)
+        for top in range(0, height, rows):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            strip = img.crop((0, top, width, min(top + rows, height)))
+            if strip.mode != "RGB":
+                strip = strip.convert("RGB")
+            array[top:top + strip.height] = np.asarray(strip)
+        return cls(array)
+
+    @classmethod
+    def open(cls, image_path: str, carrier_cache=None, cancel_token=None) -> "CarrierBuffer":
+        """
+        Decodifica l'immagine una sola volta; l'immagine PIL viene chiusa subito dopo.
+        Con carrier_cache (una CarrierCache) copia l'array in sola lettura della cache.
+        """
+        if carrier_cache is not None:
+            return cls(np.array(carrier_cache.get(image_path)))
+        with Image.open(image_path) as img:
+            return cls.from_image(img, cancel_token)
+
+    @property
+    def hwc(self) -> np.ndarray:
+        """Vista (altezza, larghezza, 3) dei pixel."""
+        return self._array
+
+    @property
+    def flat(self) -> np.ndarray:
+        """Vista piatta dei canali R, G, B di ogni pixel, riga per riga."""
+        return self._array.reshape(-1)
+
+    @property
+    def width(self) -> int:
+        return self._array.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self._array.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self._array.nbytes
+
+    def to_image(self) -> Image.Image:
+        """Copia il buffer in una nuova immagine PIL."""
+        return Image.fromarray(self._array)
+
+    def save(self, path: str, cancel_token=None):
+        """
+        Salva il buffer in modo atomico. I PNG vengono compressi a strisce direttamente
+        dall'array; gli altri formati passano da PIL. Se cancel_token viene annullato
+        prima che il file sia rinominato, il temporaneo viene eliminato e non resta nulla.
+        """
+        if os.path.splitext(path)[1].lower() in ("", ".png"):
+            with AtomicWriter(path) as f:
+                write_png(self._array, f, cancel_token=cancel_token)
+        else:
+            save_image_atomic(self.to_image(), path, cancel_token)
+
+def _write_png_chunk(f, chunk_type: bytes, data: bytes):
+    """Scrive un chunk PNG: lunghezza, tipo, dati e CRC32 di tipo + dati (senza concatenarli)."""
+    f.write(struct.pack(">I", len(data)))
+    f.write(chunk_type)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+def _filter_strip(strip: np.ndarray, above_row: np.ndarray, out: np.ndarray):
+    """
+    Filtra le righe (n, row_bytes) di una striscia in out (n, row_bytes + 1). Come PIL e
+    libpng sceglie per ogni riga il filtro con la minor somma dei valori assoluti (byte
+    letti con segno). Tutti i filtri predicono dai byte originali (sinistra, sopra, in alto
+    a sinistra), quindi vengono calcolati in blocco per l'intera striscia.
+    above_row è la riga precedente la striscia (zeri per la prima riga dell'immagine).
+    """
+    n = len(strip)
+    above = np.empty_like(strip)
+    above[0] = above_row
+    above[1:] = strip[:-1]
+    # a = sinistra, b = sopra, c = in alto a sinistra (zero fuori dall'immagine)
+    a = np.zeros(strip.shape, dtype=np.int16)
+    a[:, 3:] = strip[:, :-3]
+    b = above.astype(np.int16)
+    c = np.zeros(strip.shape, dtype=np.int16)
+    c[:, 3:] = above[:, :-3]
+
+    candidates = np.empty((len(PNG_FILTERS),) + strip.shape, dtype=np.uint8)
+    candidates[0] = strip
+    np.subtract(strip, a, out=candidates[1], casting="unsafe")
+    np.subtract(strip, above, out=candidates[2])
+    np.subtract(strip, (a + b) >> 1, out=candidates[3], casting="unsafe")
+    pa, pb, pc = np.abs(b - c), np.abs(a - c), np.abs(a + b - 2 * c)
+    paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+    np.subtract(strip, paeth, out=candidates[4], casting="unsafe")
+
+    # |byte con segno| = min(v, 256 - v)
+    costs = np.minimum(candidates, np.negative(candidates)).sum(axis=2, dtype=np.int64)
+    best = costs.argmin(axis=0)
+    out[:, 0] = best
+    out[:, 1:] = candidates[best, np.arange(n)]
+
+def write_png(array: np.ndarray, f, compress_level: int = PNG_COMPRESS_LEVEL, cancel_token=None):
+    """
+    Scrive un array RGB uint8 (h, w, 3) come PNG nel file binario aperto f.
+    Il filtro di ogni riga viene scelto come fa PIL (vedi _filter_strip), calcolato in
+    blocco per ogni striscia; i dati compressi vengono scritti man mano.
+    cancel_token viene controllato a ogni striscia e un'ultima volta dopo IEND.
+    """
+    height, width = array.shape[:2]
+    row_bytes = width * 3
+    rows = _strip_rows(width, height)
+    f.write(PNG_SIGNATURE)
+    _write_png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, zlib.MAX_WBITS, 8, PNG_COMPRESS_STRATEGY)
+    filtered = np.empty((min(rows, height), row_bytes + 1), dtype=np.uint8)
+    above_row = np.zeros(row_bytes, dtype=np.uint8)
+    for top in range(0, height, rows):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        strip = array[top:top + rows].reshape(-1, row_bytes)
+        out = filtered[:len(strip)]
+        _filter_strip(strip, above_row, out)
+        above_row = strip[-1]
+        data = compressor.compress(out)
+        if data:
+            _write_png_chunk(f, b"IDAT", data)
+    _write_png_chunk(f, b"IDAT", compressor.flush())
+    _write_png_chunk(f, b"IEND", b"")
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
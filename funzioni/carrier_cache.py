@@ -0,0 +1,98 @@
+# Cache LRU delle immagini contenitore già decodificate.
+# Utile quando molti payload diversi vengono nascosti nello stesso piccolo insieme
+# di immagini modello: la decodifica e la conversione RGB avvengono una sola volta.
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+# Limite di memoria predefinito per gli array in cache (256 MB).
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class CarrierCache:
+    """
+    Cache LRU di immagini contenitore decodificate in array NumPy RGB (h, w, 3) in sola lettura.
+
+    La chiave è (percorso assoluto, mtime, dimensione) con key_mode="stat", oppure
+    l'hash BLAKE2 del contenuto del file con key_mode="hash" (utile quando lo stesso
+    modello esiste in più copie o viene riscritto con lo stesso contenuto).
+    Quando la memoria occupata supera max_bytes vengono rimossi gli elementi
+    usati meno di recente. Gli array restituiti non sono scrivibili: chi li usa
+    per nascondere dati deve copiarli.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, key_mode: str = "stat"):
+        if key_mode not in ("stat", "hash"):
+            raise ValueError("key_mode deve essere 'stat' o 'hash'.")
+        self.max_bytes = max_bytes
+        self.key_mode = key_mode
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, image_path: str):
+        """Calcola la chiave della cache per il file indicato."""
+        if self.key_mode == "hash":
+            digest = hashlib.blake2b(digest_size=16)
+            with open(image_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            return ("hash", digest.hexdigest())
+        st = os.stat(image_path)
+        return ("stat", os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
+
+    def get(self, image_path: str) -> np.ndarray:
+        """Restituisce l'array RGB in sola lettura dell'immagine, decodificandola solo se necessario."""
+        key = self._key(image_path)
+        with self._lock:
+            arr = self._entries.get(key)
+            if arr is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return arr
+            self.misses += 1
+
+        with Image.open(image_path) as img:
+            arr = np.array(img.convert("RGB") if img.mode != "RGB" else img)
+        arr.setflags(write=False)
+
+        with self._lock:
+            # Un'immagine più grande dell'intera cache non viene memorizzata
+            if key not in self._entries and arr.nbytes <= self.max_bytes:
+                self._entries[key] = arr
+                self._bytes += arr.nbytes
+                self._evict()
+        return arr
+
+    def _evict(self):
+        """Rimuove gli elementi meno usati finché la memoria rientra nel limite."""
+        while self._bytes > self.max_bytes and self._entries:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        """Svuota la cache (le statistiche restano)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Statistiche di utilizzo: hit, miss, rimozioni, elementi e byte occupati."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
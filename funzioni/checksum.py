@@ -0,0 +1,39 @@
+# Checksum CRC32 del payload nascosto, calcolato a blocchi durante l'occultamento
+# e il recupero: l'integrità si verifica nello stesso passaggio dell'estrazione.
+# Solo libreria standard, così anche text_in_image e probe restano senza NumPy.
+import zlib
+
+# Campo aggiunto in coda agli header testuali ('w,h,...' e 'nome,dimensione'):
+# il prefisso lo distingue da una dimensione o da un nome file contenente virgole.
+CHECKSUM_FIELD_PREFIX = "crc32="
+
+class StreamingChecksum:
+    """CRC32 aggiornato un blocco alla volta (bytes, memoryview o array NumPy contigui)."""
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def field(self) -> str:
+        """Campo da aggiungere all'header, es. 'crc32=1a2b3c4d'."""
+        return f"{CHECKSUM_FIELD_PREFIX}{self.value:08x}"
+
+    def verify(self, expected: int | None, what: str):
+        """
+        Solleva ValueError se expected non corrisponde; what descrive i dati nel messaggio
+        (es. 'il file nascosto'). expected None indica un formato senza checksum.
+        """
+        if expected is not None and expected != self.value:
+            raise ValueError(f"Checksum non corrispondente per {what}: dati corrotti o incompleti "
+                             f"(atteso {expected:08x}, calcolato {self.value:08x}).")
+
+def parse_checksum_field(field: str) -> int | None:
+    """Valore del campo 'crc32=...' oppure None se il campo non è un checksum."""
+    if not field.startswith(CHECKSUM_FIELD_PREFIX):
+        return None
+    try:
+        return int(field[len(CHECKSUM_FIELD_PREFIX):], 16)
+    except ValueError:
+        return None
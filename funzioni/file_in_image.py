@@ -1,6 +1,11 @@
-import numpy as np
 from PIL import Image
 import os
+from utility import AtomicWriter
+from funzioni.bitplane import chunk_channels, bytes_to_bits, bits_to_bytes, embed_lsb, extract_lsb
+from funzioni.carrier import CarrierBuffer
+from funzioni.checksum import StreamingChecksum, parse_checksum_field
+from funzioni.quality import quality_report, format_quality_report
+from funzioni.progress import ProgressReporter, CancellationToken, OperationCancelled, console_progress, cancel_on_interrupt
 
 # Spazio massimo riservato in bit per l'header dei metadati (lunghezza + dati).
 METADATA_HEADER_MAX_BITS = 8192 # 1 KB per sicurezza (nome file lungo)
@@ -11,12 +16,14 @@ def setLastNBits(value: int, bits: str) -> int:
     """Setta l'ultimo bit di un numero."""
     return (value & 254) | int(bits)
 
-def _hide_file_metadata(image_array, filename, filesize):
+def _hide_file_metadata(image_array, filename, filesize, checksum: StreamingChecksum = None):
     """
-    Nasconde i metadati del file (nome, dimensione) usando un prefisso di lunghezza.
+    Nasconde i metadati del file (nome, dimensione e, se indicato, checksum) usando un prefisso di lunghezza.
     Formato: [Lunghezza dei metadati (16 bit)] [Dati dei metadati (N*8 bit)]
     """
     metadata_string = f"{os.path.basename(filename)},{filesize}"
+    if checksum is not None:
+        metadata_string += f",{checksum.field()}"
     metadata_bytes = metadata_string.encode('utf-8')
 
     if len(metadata_bytes) * 8 + METADATA_LEN_BITS > METADATA_HEADER_MAX_BITS:
@@ -32,7 +39,7 @@ def _hide_file_metadata(image_array, filename, filesize):
     return image_array
 
 def _get_file_metadata(image_array):
-    """Recupera i metadati del file (nome, dimensione)."""
+    """Recupera i metadati del file (nome, dimensione, checksum o None per le immagini senza)."""
     len_prefix_bin = "".join(str(image_array[i] & 1) for i in range(METADATA_LEN_BITS))
     metadata_len_bytes = int(len_prefix_bin, 2)
 
@@ -45,17 +52,54 @@ def _get_file_metadata(image_array):
     metadata_bin = "".join(str(image_array[i] & 1) for i in range(start_index, end_index))
     metadata_bytes = int(metadata_bin, 2).to_bytes((len(metadata_bin) + 7) // 8, 'big')
     metadata_string = metadata_bytes.decode('utf-8')
+
+    head, _, last = metadata_string.rpartition(',')
+    checksum = parse_checksum_field(last)
+    if checksum is not None:
+        metadata_string = head
     
     parts = metadata_string.split(',')
     if len(parts) != 2:
         raise ValueError("Formato metadati non corretto.")
 
-    return {"filename": parts[0], "filesize": int(parts[1])}
+    return {"filename": parts[0], "filesize": int(parts[1]), "checksum": checksum}
+
+def _read_file_payload(image_array, metadata, reporter: ProgressReporter = None):
+    """
+    Estrae il file nascosto a blocchi di byte (generatore) aggiornando il checksum;
+    dopo l'ultimo blocco solleva ValueError se non corrisponde a quello dell'header.
+    """
+    payload_offset = METADATA_HEADER_MAX_BITS
+    total_bits_to_read = metadata["filesize"] * 8
+    if payload_offset + total_bits_to_read > len(image_array):
+        raise ValueError("I metadati indicano una dimensione del file maggiore dello spazio disponibile.")
 
-def hideFile(container_img_path: str, secret_file_path: str, output_img_path: str):
-    """Nasconde un file generico in un'immagine."""
+    checksum = StreamingChecksum()
+    chunk = chunk_channels(len(image_array))
+    for start in range(0, total_bits_to_read, chunk):
+        count = min(chunk, total_bits_to_read - start)
+        data = bits_to_bytes(extract_lsb(image_array, payload_offset + start, count))
+        checksum.update(data)
+        yield data
+        if reporter is not None:
+            reporter.update(count)
+    checksum.verify(metadata["checksum"], "il file nascosto")
+
+def hideFile(container_img_path: str, secret_file_path: str, output_img_path: str, carrier_cache=None,
+             progress=None, cancel_token=None, quality=False, verify=False):
+    """
+    Nasconde un file generico in un'immagine.
+    Con carrier_cache (una CarrierCache) l'immagine contenitore viene copiata
+    dalla cache invece di essere riaperta e riconvertita.
+    Il file viene scritto a blocchi: dopo ogni blocco viene chiamata progress(info)
+    e controllato cancel_token; se l'operazione è annullata non viene salvato nulla.
+    Con quality=True restituisce il report di qualità (vedi funzioni.quality.quality_report).
+    Nell'header viene scritto il CRC32 del file; con verify=True, prima di salvare, il file
+    viene riletto dall'array in memoria e confrontato (ValueError se non corrisponde).
+    """
     try:
-        container_img = Image.open(container_img_path).convert("RGB")
+        # Unica copia dei pixel del contenitore per tutta l'operazione
+        carrier = CarrierBuffer.open(container_img_path, carrier_cache, cancel_token)
         with open(secret_file_path, 'rb') as f:
             secret_data = f.read()
     except FileNotFoundError as e:
@@ -63,7 +107,7 @@ def hideFile(container_img_path: str, secret_file_path: str, output_img_path: st
 
     filesize = len(secret_data)
     required_bits = filesize * 8 + METADATA_HEADER_MAX_BITS
-    available_bits = container_img.width * container_img.height * 3 # Usando 1 LSB
+    available_bits = carrier.flat.size # Usando 1 LSB
 
     if available_bits < required_bits:
         available_kb = available_bits / 8 / 1024
@@ -75,51 +119,65 @@ def hideFile(container_img_path: str, secret_file_path: str, output_img_path: st
                         f"Spazio disponibile: {available_kb:.2f} KB\n"
                         f"Mancano: {required_kb - available_kb:.2f} KB")
 
-    arr = np.array(container_img).flatten().copy()
-    
-    # 1. Nascondi i metadati
-    arr = _hide_file_metadata(arr, secret_file_path, filesize)
+    arr = carrier.flat
+    # Solo il report di qualità ha bisogno di una seconda copia (l'originale da confrontare)
+    original = arr.copy() if quality else None
 
-    # 2. Nascondi il file
+    # 1. Nascondi il file, un blocco alla volta (chunk_channels() bit = 1/8 di byte ciascuno)
     payload_offset = METADATA_HEADER_MAX_BITS
-    secret_data_bin = ''.join(format(byte, '08b') for byte in secret_data)
+    reporter = ProgressReporter(filesize * 8, progress, cancel_token)
+    chunk_bytes = chunk_channels(len(arr)) // 8
+    secret_view = memoryview(secret_data)
+    checksum = StreamingChecksum()
     
-    for i in range(len(secret_data_bin)):
-        arr[payload_offset + i] = setLastNBits(arr[payload_offset + i], secret_data_bin[i])
+    for start in range(0, filesize, chunk_bytes):
+        chunk = secret_view[start:start + chunk_bytes]
+        checksum.update(chunk)
+        bits = bytes_to_bits(chunk)
+        embed_lsb(arr, payload_offset + start * 8, bits)
+        reporter.update(len(bits))
+    reporter.check()
+
+    # 2. Nascondi i metadati, ora che il checksum è completo
+    arr = _hide_file_metadata(arr, secret_file_path, filesize, checksum)
+
+    # 3. Verifica facoltativa sull'array in memoria, senza decodificare il file salvato
+    if verify:
+        metadata = _get_file_metadata(arr)
+        if (metadata["filename"], metadata["filesize"]) != (os.path.basename(secret_file_path), filesize):
+            raise ValueError("Verifica fallita: i metadati riletti non corrispondono.")
+        for _ in _read_file_payload(arr, metadata):
+            pass
         
-    # 3. Salva l'immagine
-    steg_img = Image.fromarray(arr.reshape(container_img.height, container_img.width, 3))
-    steg_img.save(output_img_path)
+    # 4. Salva l'immagine direttamente dal buffer
+    carrier.save(output_img_path, cancel_token)
+    if quality:
+        return quality_report(original, arr, modified_end=payload_offset + filesize * 8)
 
-def recoverFile(steg_img_path: str, output_dir: str):
-    """Recupera un file nascosto da un'immagine."""
+def recoverFile(steg_img_path: str, output_dir: str, progress=None, cancel_token=None):
+    """
+    Recupera un file nascosto da un'immagine.
+    Il file viene estratto e scritto a blocchi: dopo ogni blocco viene chiamata
+    progress(info) e controllato cancel_token; se l'operazione è annullata o il
+    checksum non corrisponde il file parziale viene eliminato.
+    """
     try:
-        steg_img = Image.open(steg_img_path).convert("RGB")
+        arr = CarrierBuffer.open(steg_img_path, cancel_token=cancel_token).flat
     except FileNotFoundError:
         raise ValueError(f"Immagine non trovata: {steg_img_path}")
-        
-    arr = np.array(steg_img).flatten()
     
     # 1. Recupera i metadati
     metadata = _get_file_metadata(arr)
     filename = metadata["filename"]
-    filesize = metadata["filesize"]
-    
-    # 2. Estrai i bit del file
-    payload_offset = METADATA_HEADER_MAX_BITS
-    total_bits_to_read = filesize * 8
-    
-    if payload_offset + total_bits_to_read > len(arr):
-        raise ValueError("I metadati indicano una dimensione del file maggiore dello spazio disponibile.")
-    
-    extracted_bits = "".join(str(arr[i] & 1) for i in range(payload_offset, payload_offset + total_bits_to_read))
-    
-    # 3. Converti i bit in byte e salva il file
-    extracted_bytes = int(extracted_bits, 2).to_bytes(filesize, 'big')
     
+    # 2. Estrai i bit a blocchi e scrivili nel file; il checksum viene verificato
+    #    durante l'estrazione e, se non corrisponde, il file parziale viene eliminato
     output_path = os.path.join(output_dir, f"recovered_{filename}")
-    with open(output_path, 'wb') as f:
-        f.write(extracted_bytes)
+    reporter = ProgressReporter(metadata["filesize"] * 8, progress, cancel_token)
+    with AtomicWriter(output_path) as f:
+        for data in _read_file_payload(arr, metadata, reporter):
+            f.write(data)
+        reporter.check()
         
     return output_path
 
@@ -204,10 +262,15 @@ def handle_hide_file():
         base_name, _ = os.path.splitext(os.path.basename(container_path))
         output_path = os.path.join(dir_name, f"{base_name}_steg_file.png")
         
-        print("\nInizio occultamento del file...")
-        hideFile(container_path, secret_path, output_path)
+        print("\nInizio occultamento del file... (Ctrl+C per annullare)")
+        with cancel_on_interrupt(CancellationToken()) as token:
+            report = hideFile(container_path, secret_path, output_path, progress=console_progress,
+                              cancel_token=token, quality=True, verify=True)
         print(f"\nSUCCESSO: File nascosto e salvato in '{output_path}'.")
+        print(f"\n{format_quality_report(report)}")
         
+    except OperationCancelled:
+        print("\nOperazione annullata.")
     except (ValueError, Exception) as e:
         print(f"\nERRORE: {e}")
 
@@ -218,10 +281,13 @@ def handle_recover_file():
         steg_path = get_existing_file_path("Percorso dell'immagine con il file nascosto: ")
         output_dir = os.path.dirname(steg_path)
         
-        print("\nInizio recupero del file...")
-        recovered_file = recoverFile(steg_path, output_dir)
+        print("\nInizio recupero del file... (Ctrl+C per annullare)")
+        with cancel_on_interrupt(CancellationToken()) as token:
+            recovered_file = recoverFile(steg_path, output_dir, progress=console_progress, cancel_token=token)
         print(f"\nSUCCESSO: File recuperato e salvato come '{recovered_file}'.")
 
+    except OperationCancelled:
+        print("\nOperazione annullata.")
     except (ValueError, Exception) as e:
         print(f"\nERRORE durante il recupero: {e}")
 
@@ -1,12 +1,47 @@
 import numpy as np
 from PIL import Image
+import math
 import os
+import time
+from utility import save_image_atomic, get_image_size
+from funzioni.carrier import CarrierBuffer
+from funzioni.bitplane import CHUNK_CHANNELS, chunk_channels, top_bits, low_bits, bits_to_values
+from funzioni.checksum import StreamingChecksum, parse_checksum_field
+from funzioni.quality import quality_report, format_quality_report
+from funzioni.progress import ProgressReporter, CancellationToken, OperationCancelled, console_progress, cancel_on_interrupt
 
 # Spazio massimo riservato in bit per l'header dei metadati (lunghezza + dati).
 # 4096 bit = 512 byte.
 METADATA_HEADER_MAX_BITS = 4096
 # Bit usati per memorizzare la lunghezza dei metadati (2 byte = 16 bit).
 METADATA_LEN_BITS = 16
+# Gruppi (di 3 canali del contenitore) elaborati al massimo per blocco: limita gli array
+# temporanei di posizioni e indici a pochi MB, indipendentemente dalle dimensioni delle immagini.
+CHUNK_GROUPS = 1 << 16
+# Modello di costo di hideImage usato da plan_secret_fit: una parte per canale del contenitore
+# (decodifica, copia e salvataggio), una per gruppo scritto (e riletto con verify) e una per
+# pixel dell'immagine segreta originale (miniatura e riduzione). Il costo per canale dipende
+# dalla compressibilità del contenitore: misurato su 12 MP va da 23 ns (piatto) a 137 ns
+# (texture fine); il valore è quello dei contenitori simili a foto, quindi la stima può
+# sbagliare di circa ±50% ai due estremi.
+PLAN_SECONDS_PER_CHANNEL = 7e-8
+PLAN_SECONDS_PER_GROUP = 3e-7
+PLAN_VERIFY_SECONDS_PER_GROUP = 2e-7
+PLAN_SECONDS_PER_SECRET_PIXEL = 2e-8
+# Pixel sotto cui plan_secret_fit non riduce l'immagine segreta per rispettare max_seconds
+PLAN_MIN_SECRET_PIXELS = 64 * 64
+# PSNR minimo predefinito del contenitore (dB) per plan_secret_fit
+PLAN_MIN_PSNR = 40.0
+# La stima del PSNR suppone LSB del contenitore uniformi e indipendenti dai bit scritti: su
+# contenitori piatti o con immagini segrete regolari sbaglia anche di 2 dB. hideImageFitted
+# misura quindi il PSNR reale prima di salvare e, se è sotto il minimo, ripianifica alzando
+# la soglia dello scarto misurato più PLAN_PSNR_MARGIN, al più PLAN_MAX_ATTEMPTS volte.
+PLAN_PSNR_MARGIN = 0.1
+PLAN_MAX_ATTEMPTS = 3
+# Lato massimo della miniatura su cui si stima la perdita dovuta al ridimensionamento
+PLAN_THUMBNAIL_SIZE = 256
+# Oltre questo rapporto la riduzione passa prima da Image.reduce (media a blocchi interi, veloce)
+PLAN_REDUCING_GAP = 2.0
 
 def setLastNBits(value: int, bits: str, n: int) -> int:
     """Setta gli ultimi n bits di un numero."""
@@ -26,6 +61,8 @@ def _hide_metadata(image_array, params):
     Formato: [Lunghezza dei metadati (16 bit)] [Dati dei metadati (N*8 bit)]
     """
     metadata_string = f"{params['w']},{params['h']},{params['lsb']},{params['msb']},{params['div']}"
+    if params.get("checksum") is not None:
+        metadata_string += f",{params['checksum'].field()}"
     metadata_bytes = metadata_string.encode('utf-8')
     
     # Controlla se i metadati sono troppo grandi
@@ -76,66 +113,151 @@ def _get_metadata(image_array):
         "h": int(parts[1]),
         "lsb": int(parts[2]),
         "msb": int(parts[3]),
-        "div": float(parts[4])
+        "div": float(parts[4]),
+        # Le immagini create prima dell'introduzione del checksum hanno solo 5 campi
+        "checksum": parse_checksum_field(parts[5]) if len(parts) > 5 else None,
     }
 
-def hideImage(img1: Image, img2: Image, new_img: str, lsb=4, msb=4, custom_div=None):
-    """Nasconde un'immagine in un'altra."""
-    if img1.mode != "RGB": img1 = img1.convert("RGB")
+def _group_positions(pos: float, count: int, step: float):
+    """
+    Posizioni (float) di `count` gruppi consecutivi a partire da pos, distanziati di step.
+    Le somme sono sequenziali come nel ciclo originale (pos += div * 3), quindi gli
+    arrotondamenti coincidono con quelli delle immagini create in precedenza.
+    Restituisce (posizioni, posizione del gruppo successivo).
+    """
+    positions = np.full(count, step, dtype=np.float64)
+    positions[0] = pos
+    np.cumsum(positions, out=positions)
+    return positions, positions[-1] + step
+
+def _group_count(secret_channels: int, lsb: int, msb: int) -> int:
+    """Gruppi di 3*lsb bit necessari per i bit msb di secret_channels canali (l'ultimo completato con zeri)."""
+    return -(-secret_channels * msb // (3 * lsb))
+
+def fits_in_container(container_channels: int, secret_channels: int, lsb: int, msb: int) -> bool:
+    """
+    True se l'immagine segreta entra nel contenitore: ogni gruppo occupa 3 canali interi
+    dopo l'header dei metadati e i gruppi non possono sovrapporsi (div >= 1).
+    """
+    return _group_count(secret_channels, lsb, msb) * 3 <= container_channels - METADATA_HEADER_MAX_BITS
+
+class PsnrBelowMinimum(ValueError):
+    """Sollevata da hideImage, prima di salvare, se il PSNR del contenitore è sotto min_psnr."""
+
+    def __init__(self, psnr: float, min_psnr: float):
+        super().__init__(f"PSNR del contenitore {psnr:.2f} dB inferiore al minimo richiesto ({min_psnr:.2f} dB).")
+        self.psnr = psnr
+        self.min_psnr = min_psnr
+
+def hideImage(img1: Image, img2: Image, new_img: str, lsb=4, msb=4, custom_div=None, carrier_cache=None,
+              progress=None, cancel_token=None, quality=False, verify=False, min_psnr=None):
+    """
+    Nasconde un'immagine in un'altra.
+    img1 può essere anche il percorso dell'immagine contenitore; in tal caso, con
+    carrier_cache (una CarrierCache), viene copiata dalla cache invece di essere riaperta.
+    L'immagine segreta viene scritta a blocchi: dopo ogni blocco viene chiamata
+    progress(info) e controllato cancel_token; se l'operazione è annullata non viene salvato nulla.
+    Con quality=True restituisce il report di qualità (vedi funzioni.quality.quality_report).
+    Nell'header viene scritto il CRC32 dei bit nascosti dell'immagine segreta; con verify=True,
+    prima di salvare, l'immagine viene recuperata dall'array in memoria e il checksum
+    confrontato (ValueError se non corrisponde).
+    Con min_psnr l'errore quadratico viene sommato esattamente sui canali modificati durante
+    la scrittura; se il PSNR risultante è inferiore solleva PsnrBelowMinimum e non salva nulla.
+    """
+    # Unica copia dei pixel del contenitore per tutta l'operazione
+    if isinstance(img1, str):
+        carrier = CarrierBuffer.open(img1, carrier_cache, cancel_token)
+    else:
+        carrier = CarrierBuffer.from_image(img1, cancel_token)
     if img2.mode != "RGB": img2 = img2.convert("RGB")
+    height1, width1 = carrier.height, carrier.width
 
-    required_space_bits = (img2.width * img2.height * 3 * msb) + METADATA_HEADER_MAX_BITS
-    available_space_bits = (img1.width * img1.height * 3 * lsb)
-    if available_space_bits < required_space_bits:
+    if not fits_in_container(width1 * height1 * 3, img2.width * img2.height * 3, lsb, msb):
         raise ValueError("L'immagine contenitore è troppo piccola per i parametri scelti.")
 
-    arr1 = np.array(img1).flatten().copy()
-    arr2 = np.array(img2).flatten().copy()
+    arr1 = carrier.flat
+    arr2 = np.asarray(img2).reshape(-1)
+    # Solo il report di qualità ha bisogno di una seconda copia (l'originale da confrontare)
+    original = arr1.copy() if quality else None
 
     payload_offset = METADATA_HEADER_MAX_BITS
     payload_space_len = len(arr1) - payload_offset
     
-    # Usa il div personalizzato se fornito, altrimenti calcola automaticamente
-    if custom_div is not None:
-        div = custom_div
-    else:
-        div = (payload_space_len * lsb) / (len(arr2) * msb) if (len(arr2) * msb) > 0 else 0
+    # Usa il div personalizzato se fornito, altrimenti calcola automaticamente.
+    # Con div < 1 i gruppi si sovrappongono; oltre il div ottimale gli ultimi cadono dopo la
+    # fine dell'immagine. In entrambi i casi il checksum non potrebbe mai corrispondere.
+    max_div = calculate_optimal_div(carrier, img2, lsb, msb)
+    div = custom_div if custom_div is not None else max_div
+    if div < 1:
+        raise ValueError(f"Il valore div deve essere almeno 1 (ricevuto {div}): i gruppi si sovrapporrebbero.")
+    if div > max_div:
+        raise ValueError(f"Valore div troppo grande ({div}): gli ultimi gruppi uscirebbero dall'immagine "
+                         f"(massimo {max_div:.6f}).")
 
-    i = 0
+    # I bit più significativi (msb) di ogni canale segreto formano un flusso che viene
+    # diviso in gruppi di 3*lsb bit; ogni gruppo va negli lsb bit di 3 canali consecutivi
+    # del contenitore, alla posizione round(pos), con pos che avanza di div*3 per gruppo.
+    group_bits = lsb * 3
+    keep_mask = 0xFF ^ ((1 << lsb) - 1)
+    secret_mask = 0xFF ^ ((1 << (8 - msb)) - 1)
+    chunk_groups = chunk_channels(len(arr1), CHUNK_GROUPS * 3) // 3
+    chunk_bytes = group_bits * max(1, chunk_groups // msb) # multiplo di group_bits: ogni blocco contiene gruppi interi
+    reporter = ProgressReporter(len(arr2) * msb, progress, cancel_token)
+    checksum = StreamingChecksum()
     pos = 0.0
-    bit_queue = ""
-    
-    while i < len(arr2):
-        r, g, b = arr2[i], arr2[i + 1], arr2[i + 2]
-        bit_queue += format(r, '08b')[:msb]
-        bit_queue += format(g, '08b')[:msb]
-        bit_queue += format(b, '08b')[:msb]
-        
-        while len(bit_queue) >= lsb * 3:
-            j_abs = round(pos) + payload_offset
-            if j_abs + 2 < len(arr1):
-                bits_to_hide = bit_queue[:lsb*3]
-                bit_queue = bit_queue[lsb*3:]
-                r_bits, g_bits, b_bits = bits_to_hide[:lsb], bits_to_hide[lsb:2*lsb], bits_to_hide[2*lsb:3*lsb]
-                arr1[j_abs] = setLastNBits(arr1[j_abs], r_bits, lsb)
-                arr1[j_abs + 1] = setLastNBits(arr1[j_abs + 1], g_bits, lsb)
-                arr1[j_abs + 2] = setLastNBits(arr1[j_abs + 2], b_bits, lsb)
-                pos += div * 3
-            else:
-                bit_queue = ""
-                break
-        i += 3
-
-    params = {"w": img2.width, "h": img2.height, "lsb": lsb, "msb": msb, "div": div}
+    squared_error = 0
+
+    for start in range(0, len(arr2), chunk_bytes):
+        # Il checksum copre i canali segreti come li ricostruisce getImage (solo i bit msb)
+        checksum.update(arr2[start:start + chunk_bytes] & secret_mask)
+        bits = top_bits(arr2[start:start + chunk_bytes], msb)
+        n_bits = len(bits)
+        # L'ultimo gruppo incompleto viene completato con zeri
+        if n_bits % group_bits:
+            bits = np.concatenate((bits, np.zeros(group_bits - n_bits % group_bits, dtype=np.uint8)))
+        values = bits_to_values(bits, lsb).reshape(-1, 3)
+
+        positions, pos = _group_positions(pos, len(values), div * 3)
+        j_abs = np.rint(positions).astype(np.int64) + payload_offset
+        if j_abs[-1] + 2 >= len(arr1):
+            raise ValueError("Gli ultimi gruppi uscirebbero dall'immagine: ridurre il valore div.")
+
+        # Un canale del gruppo alla volta: evita una matrice di indici (gruppi x 3)
+        for k in range(3):
+            channel_idx = j_abs + k
+            written = (arr1[channel_idx] & keep_mask) | values[:, k]
+            if min_psnr is not None:
+                diff = written.astype(np.int16) - arr1[channel_idx]
+                squared_error += int(np.einsum('i,i->', diff, diff, dtype=np.int64))
+            arr1[channel_idx] = written
+        reporter.update(n_bits)
+    reporter.check()
+
+    params = {"w": img2.width, "h": img2.height, "lsb": lsb, "msb": msb, "div": div, "checksum": checksum}
+    header = arr1[:payload_offset].copy() if min_psnr is not None else None
     arr1 = _hide_metadata(arr1, params)
 
-    Image.fromarray(arr1.reshape(img1.height, img1.width, 3)).save(new_img)
+    if min_psnr is not None:
+        # L'header precede i gruppi, quindi i due contributi non si sovrappongono
+        squared_error += int(np.count_nonzero(arr1[:payload_offset] != header))
+        mse = squared_error / len(arr1)
+        psnr = math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+        if psnr < min_psnr:
+            raise PsnrBelowMinimum(psnr, min_psnr)
 
-def getImage(img: Image, new_img: str) -> Image:
-    """Recupera un'immagine da un'altra."""
-    if img.mode != "RGB": img = img.convert("RGB")
-    arr = np.array(img).flatten().copy()
-    
+    # Verifica facoltativa sull'array in memoria, senza decodificare il file salvato
+    if verify:
+        _recover_secret(arr1)
+
+    carrier.save(new_img, cancel_token)
+    if quality:
+        return quality_report(original, arr1)
+
+def _recover_secret(arr: np.ndarray, reporter: ProgressReporter = None) -> np.ndarray:
+    """
+    Ricostruisce a blocchi l'immagine segreta (h, w, 3) dall'array piatto del contenitore,
+    aggiornando il checksum durante l'estrazione; ValueError se non corrisponde all'header.
+    """
     params = _get_metadata(arr)
     width, height, lsb, msb, div = params['w'], params['h'], params['lsb'], params['msb'], params['div']
 
@@ -143,30 +265,112 @@ def getImage(img: Image, new_img: str) -> Image:
     work_array = arr[payload_offset:]
     size = width * height * 3
     res = np.zeros(size, dtype=np.uint8)
-    
-    bits = ""
+
+    group_bits = lsb * 3
+    total_groups = -(-size * msb // group_bits)
+    chunk_groups = msb * max(1, chunk_channels(len(arr), CHUNK_GROUPS * 3) // 3 // msb) # byte segreti interi
+    checksum = StreamingChecksum()
     pos = 0.0
     n = 0
 
-    while n < size:
-        j = round(pos)
-        if j + 2 >= len(work_array): break
-        r_bits = format(work_array[j], '08b')[-lsb:]
-        g_bits = format(work_array[j+1], '08b')[-lsb:]
-        b_bits = format(work_array[j+2], '08b')[-lsb:]
-        bits += r_bits + g_bits + b_bits
-        
-        while len(bits) >= msb:
-            if n >= size: break
-            byte_bits = bits[:msb]
-            bits = bits[msb:]
-            res[n] = int(byte_bits.ljust(8, '0'), 2)
-            n += 1
-        pos += div * 3
-
-    res_img = Image.fromarray(res.reshape(height, width, 3))
-    res_img.save(new_img)
-    return res_img
+    for first_group in range(0, total_groups, chunk_groups):
+        count = min(chunk_groups, total_groups - first_group)
+        positions, pos = _group_positions(pos, count, div * 3)
+        j = np.rint(positions).astype(np.int64)
+        in_range = j + 2 < len(work_array)
+        truncated = not in_range.all()
+        if truncated:
+            j = j[in_range]
+
+        gathered = np.empty((len(j), 3), dtype=np.uint8)
+        for k in range(3):
+            gathered[:, k] = work_array[j + k]
+        bits = low_bits(gathered, lsb)
+        n_bytes = min(len(bits) // msb, size - n)
+        res[n:n + n_bytes] = bits_to_values(bits[:n_bytes * msb], msb, align_high=True)
+        checksum.update(res[n:n + n_bytes])
+        n += n_bytes
+        if reporter is not None:
+            reporter.update(n_bytes * msb)
+        if truncated:
+            break
+    if n < size:
+        # I canali mancanti restano a zero: anche loro fanno parte del checksum
+        checksum.update(res[n:])
+    checksum.verify(params["checksum"], "l'immagine nascosta")
+    return res.reshape(height, width, 3)
+
+def getImage(img: Image, new_img: str, progress=None, cancel_token=None) -> Image:
+    """
+    Recupera un'immagine da un'altra.
+    L'immagine viene letta a blocchi: dopo ogni blocco viene chiamata progress(info)
+    e controllato cancel_token; se l'operazione è annullata non viene salvato nulla.
+    Se l'header contiene un checksum viene verificato durante l'estrazione (ValueError se non corrisponde).
+    """
+    arr = CarrierBuffer.from_image(img, cancel_token).flat
+
+    params = _get_metadata(arr)
+    reporter = ProgressReporter(params['w'] * params['h'] * 3 * params['msb'], progress, cancel_token)
+    res = _recover_secret(arr, reporter)
+    reporter.check()
+
+    # Stesso scrittore PNG a strisce del contenitore: PIL allocherebbe buffer proporzionali all'immagine
+    CarrierBuffer(res).save(new_img, cancel_token)
+    return Image.fromarray(res)
+
+def getImagePreview(img: Image, new_img: str = None, step: int = 4, bits: int = None) -> Image:
+    """
+    Recupera un'anteprima a bassa risoluzione dell'immagine nascosta senza ricostruirla tutta.
+    Legge solo i canali del contenitore che contengono una riga e una colonna ogni `step`
+    dell'immagine segreta e, se indicato, solo i suoi `bits` bit più significativi (≤ msb).
+    Se new_img è indicato l'anteprima viene anche salvata.
+    """
+    if step < 1:
+        raise ValueError("Il passo dell'anteprima deve essere almeno 1.")
+    if img.mode != "RGB": img = img.convert("RGB")
+    arr = np.asarray(img).reshape(-1)
+
+    params = _get_metadata(arr)
+    width, height, lsb, msb, div = params['w'], params['h'], params['lsb'], params['msb'], params['div']
+    n_bits = msb if bits is None else max(1, min(bits, msb))
+
+    payload_offset = METADATA_HEADER_MAX_BITS
+    work_array = arr[payload_offset:]
+    group_bits = lsb * 3
+
+    # Indici dei canali segreti campionati e dei loro primi n_bits bit nel flusso nascosto
+    ys = np.arange(0, height, step)
+    xs = np.arange(0, width, step)
+    channels = ((ys[:, None] * width + xs[None, :])[:, :, None] * 3 + np.arange(3)).reshape(-1)
+    stream_bits = (channels[:, None] * msb + np.arange(n_bits)).reshape(-1)
+
+    groups = stream_bits // group_bits
+    offset_in_group = stream_bits % group_bits
+    channel_in_group = offset_in_group // lsb
+    shift = lsb - 1 - (offset_in_group % lsb)
+
+    # Posizione dei soli gruppi necessari: le somme vanno calcolate in ordine fino
+    # all'ultimo gruppo richiesto, ma un blocco alla volta per limitare la memoria.
+    needed = np.unique(groups)
+    needed_pos = np.empty(len(needed), dtype=np.int64)
+    pos = 0.0
+    chunk_groups = CHUNK_CHANNELS
+    for first_group in range(0, int(needed[-1]) + 1, chunk_groups):
+        count = min(chunk_groups, int(needed[-1]) + 1 - first_group)
+        positions, pos = _group_positions(pos, count, div * 3)
+        lo, hi = np.searchsorted(needed, [first_group, first_group + count])
+        needed_pos[lo:hi] = np.rint(positions[needed[lo:hi] - first_group]).astype(np.int64)
+
+    j = needed_pos[np.searchsorted(needed, groups)]
+    in_range = j + 2 < len(work_array)
+    carrier_idx = np.where(in_range, j + channel_in_group, 0)
+    bit_values = np.where(in_range, (work_array[carrier_idx] >> shift) & 1, 0).astype(np.uint8)
+
+    preview = bits_to_values(bit_values, n_bits, align_high=True).reshape(len(ys), len(xs), 3)
+    preview_img = Image.fromarray(preview)
+    if new_img is not None:
+        save_image_atomic(preview_img, new_img)
+    return preview_img
 
 def find_optimal_params(container_img: Image, secret_img: Image):
     """Calcola i parametri lsb e msb ottimali."""
@@ -175,23 +379,201 @@ def find_optimal_params(container_img: Image, secret_img: Image):
     
     for lsb in range(1, 9):
         for msb in range(8, 0, -1):
-            available_space = (container_pixels * 3 * lsb)
-            required_space = (secret_pixels * 3 * msb) + METADATA_HEADER_MAX_BITS
-            if available_space >= required_space:
+            if fits_in_container(container_pixels * 3, secret_pixels * 3, lsb, msb):
                 return lsb, msb
     return None, None
 
 def calculate_optimal_div(container_img: Image, secret_img: Image, lsb: int, msb: int):
-    """Calcola il valore di div ottimale per i parametri dati."""
+    """
+    Calcola il valore di div ottimale per i parametri dati: i gruppi vengono distribuiti
+    uniformemente su tutto lo spazio dopo l'header. Contando i gruppi (e non i bit) anche
+    l'ultimo gruppo, completato con zeri, resta dentro l'immagine.
+    """
     arr1_len = container_img.width * container_img.height * 3
     arr2_len = secret_img.width * secret_img.height * 3
     
     payload_offset = METADATA_HEADER_MAX_BITS
     payload_space_len = arr1_len - payload_offset
     
-    optimal_div = (payload_space_len * lsb) / (arr2_len * msb) if (arr2_len * msb) > 0 else 0
+    groups = _group_count(arr2_len, lsb, msb)
+    optimal_div = payload_space_len / (groups * 3) if groups > 0 else 0
     return optimal_div
 
+def predicted_carrier_mse(container_channels: int, secret_channels: int, lsb: int, msb: int) -> float:
+    """
+    MSE atteso del contenitore: ogni canale scritto riceve lsb bit indipendenti da quelli
+    originali, quindi l'errore quadratico medio di un canale scritto è (4^lsb - 1) / 6.
+    """
+    written = _group_count(secret_channels, lsb, msb) * 3
+    return written / container_channels * (4 ** lsb - 1) / 6
+
+def predicted_seconds(container_channels: int, secret_channels: int, lsb: int, msb: int,
+                      verify: bool = False) -> float:
+    """Durata stimata di hideImage secondo il modello di costo (PLAN_SECONDS_PER_*)."""
+    groups = _group_count(secret_channels, lsb, msb)
+    group_seconds = PLAN_SECONDS_PER_GROUP + (PLAN_VERIFY_SECONDS_PER_GROUP if verify else 0)
+    return container_channels * PLAN_SECONDS_PER_CHANNEL + groups * group_seconds
+
+def _quantization_mse(msb: int) -> float:
+    """MSE dell'immagine recuperata dovuto ai soli msb bit nascosti (bit bassi azzerati)."""
+    step = 1 << (8 - msb)
+    return (step - 1) * (2 * step - 1) / 6
+
+def _resize_mse(thumbnail: Image, scale: float) -> float:
+    """
+    MSE stimato sulla miniatura dell'immagine segreta riducendola di scale e
+    riportandola alla dimensione iniziale.
+    """
+    if scale >= 1:
+        return 0.0
+    size = (max(1, round(thumbnail.width * scale)), max(1, round(thumbnail.height * scale)))
+    restored = thumbnail.resize(size, Image.BILINEAR).resize(thumbnail.size, Image.BILINEAR)
+    diff = np.asarray(restored, dtype=np.float32) - np.asarray(thumbnail, dtype=np.float32)
+    return float(np.mean(diff * diff))
+
+def _fit_dimensions(width: int, height: int, max_pixels: int) -> tuple:
+    """Dimensioni con le stesse proporzioni e al massimo max_pixels pixel."""
+    if width * height <= max_pixels:
+        return width, height
+    scale = (max_pixels / (width * height)) ** 0.5
+    new_width, new_height = max(1, int(width * scale)), max(1, int(height * scale))
+    # Con un lato ridotto a 1 pixel l'altro può superare il limite
+    return min(new_width, max_pixels // new_height), min(new_height, max_pixels // new_width)
+
+def plan_secret_fit(container_width: int, container_height: int, secret_img: Image, min_psnr=PLAN_MIN_PSNR,
+                    max_seconds=None, verify=False) -> dict:
+    """
+    Sceglie risoluzione dell'immagine segreta, lsb, msb e div in modo che l'occultamento
+    entri nel contenitore, con PSNR del contenitore di almeno min_psnr dB (None: nessun limite)
+    e durata stimata entro max_seconds (None: nessun limite).
+    Tra i candidati ammessi sceglie quello con il minor errore previsto dell'immagine recuperata
+    (riduzione stimata su una miniatura più quantizzazione a msb bit) e, a parità, con meno lsb.
+    Se max_seconds lascerebbe meno di PLAN_MIN_SECRET_PIXELS pixel (o dell'immagine originale,
+    se più piccola) il tempo viene ignorato: si sceglie il piano migliore senza limite di tempo
+    e 'within_time' è False. ValueError se il contenitore non ha spazio oltre l'header o se
+    nessun parametro rispetta min_psnr.
+    Restituisce width, height, resized, lsb, msb, div, predicted_psnr, predicted_seconds,
+    predicted_secret_mse e within_time.
+    """
+    container_channels = container_width * container_height * 3
+    available_groups = max(container_channels - METADATA_HEADER_MAX_BITS, 0) // 3
+    if available_groups == 0:
+        raise ValueError("L'immagine contenitore è troppo piccola per qualsiasi immagine segreta.")
+    max_mse = 255 ** 2 / 10 ** (min_psnr / 10) if min_psnr is not None else math.inf
+    resize_seconds = secret_img.width * secret_img.height * PLAN_SECONDS_PER_SECRET_PIXEL
+    fixed_seconds = container_channels * PLAN_SECONDS_PER_CHANNEL + resize_seconds
+    group_seconds = PLAN_SECONDS_PER_GROUP + (PLAN_VERIFY_SECONDS_PER_GROUP if verify else 0)
+
+    thumbnail_width, thumbnail_height = _fit_dimensions(secret_img.width, secret_img.height,
+                                                        PLAN_THUMBNAIL_SIZE * PLAN_THUMBNAIL_SIZE)
+    thumbnail = resize_secret(secret_img, thumbnail_width, thumbnail_height)
+
+    def best_candidate(group_limit):
+        best = None
+        for lsb in range(1, 9):
+            # Gruppi ammessi da capacità, distorsione e tempo (ogni gruppo modifica 3 canali)
+            max_groups = available_groups
+            if not math.isinf(max_mse):
+                max_groups = min(max_groups, int(max_mse * container_channels / (3 * (4 ** lsb - 1) / 6)))
+            if group_limit is not None:
+                max_groups = min(max_groups, group_limit)
+            for msb in range(8, 0, -1):
+                # ceil(p * msb / lsb) gruppi per p pixel: entrano se p * msb <= gruppi * lsb
+                max_pixels = max_groups * lsb // msb
+                if max_pixels < 1:
+                    continue
+                width, height = _fit_dimensions(secret_img.width, secret_img.height, max_pixels)
+                error = _resize_mse(thumbnail, width / secret_img.width) + _quantization_mse(msb)
+                if best is None or error < best[0]:
+                    best = (error, lsb, msb, width, height)
+        return best
+
+    time_groups = None
+    if max_seconds is not None:
+        time_groups = int(max(max_seconds - fixed_seconds, 0) / group_seconds)
+    best = best_candidate(time_groups)
+    min_pixels = min(PLAN_MIN_SECRET_PIXELS, secret_img.width * secret_img.height)
+    if time_groups is not None and (best is None or best[3] * best[4] < min_pixels):
+        # Il tempo basterebbe solo per un'immagine segreta ridotta a quasi nulla (o nemmeno
+        # per il costo fisso): meglio sforare il limite che perdere il contenuto
+        best = best_candidate(None)
+    if best is None:
+        raise ValueError("Nessun parametro rispetta il PSNR minimo richiesto.")
+
+    error, lsb, msb, width, height = best
+    secret_channels = width * height * 3
+    mse = predicted_carrier_mse(container_channels, secret_channels, lsb, msb)
+    groups = _group_count(secret_channels, lsb, msb)
+    seconds = predicted_seconds(container_channels, secret_channels, lsb, msb, verify) + resize_seconds
+    return {
+        "width": width,
+        "height": height,
+        "resized": (width, height) != secret_img.size,
+        "lsb": lsb,
+        "msb": msb,
+        "div": (container_channels - METADATA_HEADER_MAX_BITS) / (groups * 3),
+        "predicted_psnr": math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse),
+        "predicted_seconds": seconds,
+        "predicted_secret_mse": error,
+        "within_time": max_seconds is None or seconds <= max_seconds,
+    }
+
+def resize_secret(secret_img: Image, width: int, height: int) -> Image:
+    """Riduce l'immagine segreta: riduzione a blocchi interi (reduce) e poi bilineare."""
+    if secret_img.mode != "RGB": secret_img = secret_img.convert("RGB")
+    if secret_img.size == (width, height):
+        return secret_img
+    return secret_img.resize((width, height), Image.BILINEAR, reducing_gap=PLAN_REDUCING_GAP)
+
+def hideImageFitted(img1: Image, img2: Image, new_img: str, min_psnr=PLAN_MIN_PSNR, max_seconds=None,
+                    carrier_cache=None, progress=None, cancel_token=None, quality=False, verify=False) -> dict:
+    """
+    Come hideImage, ma sceglie da sé risoluzione dell'immagine segreta e parametri con
+    plan_secret_fit: non fallisce per mancanza di spazio. img1 può essere un percorso.
+    min_psnr è garantito sul PSNR misurato prima di salvare: se la stima era ottimista il
+    piano viene ricalcolato con meno gruppi (vedi PLAN_PSNR_MARGIN e PLAN_MAX_ATTEMPTS).
+    Restituisce il piano con la durata effettiva ('seconds'), i tentativi ('attempts') e,
+    con quality=True, il report ('quality').
+    """
+    start = time.perf_counter()
+    width, height = get_image_size(img1) if isinstance(img1, str) else img1.size
+    planned_psnr = min_psnr
+    for attempt in range(1, PLAN_MAX_ATTEMPTS + 1):
+        plan = plan_secret_fit(width, height, img2, planned_psnr, max_seconds, verify)
+        secret = resize_secret(img2, plan["width"], plan["height"])
+        try:
+            report = hideImage(img1, secret, new_img, plan["lsb"], plan["msb"], carrier_cache=carrier_cache,
+                               progress=progress, cancel_token=cancel_token, quality=quality, verify=verify,
+                               min_psnr=min_psnr)
+            break
+        except PsnrBelowMinimum as e:
+            if attempt == PLAN_MAX_ATTEMPTS:
+                raise
+            # La stima era ottimista di (previsto - misurato) dB: la soglia sale di altrettanto
+            planned_psnr += plan["predicted_psnr"] - e.psnr + PLAN_PSNR_MARGIN
+    plan["attempts"] = attempt
+    plan["seconds"] = time.perf_counter() - start
+    if quality:
+        plan["quality"] = report
+    return plan
+
+def format_fit_plan(plan: dict, original_size: tuple) -> str:
+    """Testo leggibile del piano di plan_secret_fit, per il menu e la riga di comando."""
+    size = f"{plan['width']}x{plan['height']}"
+    if plan["resized"]:
+        size += f" (ridotta da {original_size[0]}x{original_size[1]})"
+    psnr = "∞" if math.isinf(plan["predicted_psnr"]) else f"{plan['predicted_psnr']:.1f} dB"
+    lines = [
+        f"Immagine segreta: {size}",
+        f"Parametri: lsb={plan['lsb']}, msb={plan['msb']}, div={plan['div']:.6f}",
+        f"PSNR previsto del contenitore: {psnr}",
+        f"Durata stimata: {plan['predicted_seconds']:.2f} s",
+    ]
+    if not plan["within_time"]:
+        lines.append("ATTENZIONE: il limite di tempo non è rispettabile con questo contenitore "
+                     "senza perdere l'immagine segreta: il piano lo ignora.")
+    return "\n".join(lines)
+
 def get_image_path(prompt: str) -> str:
     """Chiede all'utente un percorso per un'immagine e controlla se esiste."""
     while True:
@@ -224,9 +606,17 @@ def handle_hide_image():
         print("\nCalcolo dei parametri ottimali in corso...")
         lsb, msb = find_optimal_params(container_img, secret_img)
         if lsb is None:
-            print("\nERRORE: L'immagine contenitore è troppo piccola.")
-            return
-        
+            # Non entra con nessun parametro: l'immagine segreta viene ridotta
+            try:
+                plan = plan_secret_fit(container_img.width, container_img.height, secret_img, verify=True)
+            except ValueError as e:
+                print(f"\nERRORE: {e}")
+                return
+            print("\nL'immagine segreta non entra nel contenitore e verrà ridotta.")
+            print(format_fit_plan(plan, secret_img.size))
+            secret_img = resize_secret(secret_img, plan["width"], plan["height"])
+            lsb, msb = plan["lsb"], plan["msb"]
+
         # Calcola il div ottimale
         optimal_div = calculate_optimal_div(container_img, secret_img, lsb, msb)
         print(f"Parametri ottimali calcolati: lsb={lsb}, msb={msb}")
@@ -248,15 +638,13 @@ def handle_hide_image():
             modify_div = input("Vuoi modificare il valore div? (s/n): ").lower().strip()
             if modify_div in ['s', 'si', 'sì', 'y', 'yes']:
                 try:
-                    min_div = optimal_div * 0.1
-                    max_div = optimal_div * 2.0
+                    # Sotto 1 i gruppi si sovrappongono, oltre l'ottimale escono dall'immagine
+                    min_div, max_div = 1.0, optimal_div
                     print(f"Inserisci un valore tra {min_div:.6f} e {max_div:.6f}")
                     custom_div = float(input(f"Valore div (premere Invio per {optimal_div:.6f}): ") or optimal_div)
                     if not (min_div <= custom_div <= max_div):
-                        print(f"ATTENZIONE: Valore fuori dal range raccomandato.")
-                        confirm = input("Continuare comunque? (s/n): ").lower().strip()
-                        if confirm not in ['s', 'si', 'sì', 'y', 'yes']:
-                            custom_div = optimal_div
+                        print("Valore fuori dal range valido. Usando il valore ottimale.")
+                        custom_div = optimal_div
                 except ValueError:
                     print("Valore non valido. Usando il valore ottimale.")
                     custom_div = optimal_div
@@ -270,10 +658,15 @@ def handle_hide_image():
 
     output_path = os.path.join(os.path.dirname(container_img_path), f"{os.path.splitext(os.path.basename(container_img_path))[0]}_steg_img.png")
     
-    print("\nInizio occultamento dell'immagine...")
+    print("\nInizio occultamento dell'immagine... (Ctrl+C per annullare)")
     try:
-        hideImage(container_img, secret_img, output_path, lsb, msb, custom_div)
+        with cancel_on_interrupt(CancellationToken()) as token:
+            report = hideImage(container_img, secret_img, output_path, lsb, msb, custom_div,
+                               progress=console_progress, cancel_token=token, quality=True, verify=True)
         print(f"\nSUCCESSO: Immagine nascosta e salvata in '{output_path}'.")
+        print(f"\n{format_quality_report(report)}")
+    except OperationCancelled:
+        print("\nOperazione annullata.")
     except ValueError as e:
         print(f"\nERRORE: {e}")
 
@@ -284,13 +677,34 @@ def handle_recover_image():
     source_img = Image.open(source_img_path)
     output_path = os.path.join(os.path.dirname(source_img_path), f"recovered_image.png")
 
-    print("\nInizio recupero automatico dell'immagine...")
+    print("\nInizio recupero automatico dell'immagine... (Ctrl+C per annullare)")
     try:
-        getImage(source_img, output_path)
+        with cancel_on_interrupt(CancellationToken()) as token:
+            getImage(source_img, output_path, progress=console_progress, cancel_token=token)
         print(f"\nSUCCESSO: Immagine recuperata e salvata in '{output_path}'.")
+    except OperationCancelled:
+        print("\nOperazione annullata.")
     except Exception as e:
         print(f"\nERRORE durante il recupero: {e}")
 
+def handle_preview_image():
+    """Gestisce il flusso per recuperare solo un'anteprima dell'immagine nascosta."""
+    print("--- Anteprima Immagine Nascosta ---")
+    source_img_path = get_image_path("Percorso dell'immagine con i dati nascosti: ")
+    source_img = Image.open(source_img_path)
+    try:
+        step = int(input("Una riga/colonna ogni quante (premere Invio per 4): ") or "4")
+    except ValueError:
+        print("Valore non valido. Uso 4.")
+        step = 4
+    output_path = os.path.join(os.path.dirname(source_img_path), f"preview_image.png")
+
+    try:
+        preview = getImagePreview(source_img, output_path, step=step)
+        print(f"\nSUCCESSO: Anteprima {preview.width}x{preview.height} salvata in '{output_path}'.")
+    except Exception as e:
+        print(f"\nERRORE durante il recupero dell'anteprima: {e}")
+
 def show_container_capacity(container_img: Image):
     """Mostra la capacità dell'immagine contenitore per ogni valore di LSB possibile."""
     container_pixels = container_img.width * container_img.height
@@ -300,11 +714,8 @@ def show_container_capacity(container_img: Image):
     print("----|---------------------|--------------------------------")
     
     for lsb in range(1, 9):
-        # Capacità totale in bit (3 canali RGB)
-        total_capacity_bits = container_pixels * 3 * lsb
-        
-        # Capacità disponibile sottraendo lo spazio per i metadati
-        available_capacity_bits = total_capacity_bits - METADATA_HEADER_MAX_BITS
+        # Capacità disponibile: solo i canali dopo l'header dei metadati, a gruppi di 3
+        available_capacity_bits = (container_pixels * 3 - METADATA_HEADER_MAX_BITS) // 3 * 3 * lsb
         
         # Capacità in KB (1 KB = 1024 byte)
         available_capacity_kb = (available_capacity_bits // 8) / 1024
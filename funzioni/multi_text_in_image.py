@@ -0,0 +1,243 @@
+import os
+import struct
+import numpy as np
+from utility import clear_screen
+from funzioni.carrier import CarrierBuffer
+from funzioni.bitplane import bytes_to_bits, bits_to_bytes, embed_lsb, extract_lsb
+from funzioni.checksum import StreamingChecksum
+from funzioni.quality import quality_report, format_quality_report
+
+# Formato (1 bit LSB per canale RGB, bit ordinati dal più significativo):
+#   [header: magic (4 byte) | versione (1) | numero messaggi (2) | lunghezza tabella (4)]
+#   [tabella: per ogni messaggio id (2) | lunghezza in byte (4) | CRC32 (4) | lunghezza etichetta (1) | etichetta UTF-8]
+#   [messaggi UTF-8 concatenati, nell'ordine della tabella]
+# Per elencare i messaggi basta leggere header e tabella; per recuperarne uno si
+# leggono solo i suoi bit, all'offset ricavato sommando le lunghezze precedenti,
+# e si verifica il suo CRC32. La versione 1 non aveva il CRC32 e resta leggibile.
+MULTI_MAGIC = b"STGM"
+MULTI_VERSION = 2
+HEADER_FORMAT = ">4sBHI"
+HEADER_BYTES = struct.calcsize(HEADER_FORMAT)
+ENTRY_FORMATS = {1: ">HIB", 2: ">HIIB"}
+ENTRY_FORMAT = ENTRY_FORMATS[MULTI_VERSION]
+MAX_LABEL_BYTES = 255
+
+def _build_table(messages) -> tuple:
+    """Costruisce tabella e corpo a partire da una lista di testi o coppie (etichetta, testo)."""
+    if len(messages) > 0xFFFF:
+        raise ValueError("Troppi messaggi (max 65535).")
+    table = bytearray()
+    bodies = []
+    for message_id, item in enumerate(messages, start=1):
+        label, text = item if isinstance(item, tuple) else ("", item)
+        label_bytes = label.encode('utf-8')
+        if len(label_bytes) > MAX_LABEL_BYTES:
+            raise ValueError(f"Etichetta del messaggio {message_id} troppo lunga (max {MAX_LABEL_BYTES} byte).")
+        body = text.encode('utf-8')
+        checksum = StreamingChecksum()
+        checksum.update(body)
+        table += struct.pack(ENTRY_FORMAT, message_id, len(body), checksum.value, len(label_bytes)) + label_bytes
+        bodies.append(body)
+    return bytes(table), bodies
+
+def _read_bytes(flat: np.ndarray, byte_offset: int, count: int) -> bytes:
+    """Legge count byte nascosti a partire dal byte byte_offset del flusso LSB."""
+    if (byte_offset + count) * 8 > len(flat):
+        raise ValueError("I dati nascosti superano la dimensione dell'immagine.")
+    return bits_to_bytes(extract_lsb(flat, byte_offset * 8, count * 8))
+
+def _read_table(flat: np.ndarray) -> list:
+    """
+    Legge header e tabella; restituisce le voci con l'offset (in byte) di ogni messaggio
+    e il suo CRC32 (None per la versione 1 del formato).
+    """
+    magic, version, count, table_len = struct.unpack(HEADER_FORMAT, _read_bytes(flat, 0, HEADER_BYTES))
+    if magic != MULTI_MAGIC:
+        raise ValueError("Nessuna raccolta di messaggi trovata nell'immagine.")
+    if version not in ENTRY_FORMATS:
+        raise ValueError(f"Versione del formato non supportata: {version}.")
+    entry_format = ENTRY_FORMATS[version]
+    entry_bytes = struct.calcsize(entry_format)
+
+    table = _read_bytes(flat, HEADER_BYTES, table_len)
+    entries = []
+    cursor = 0
+    offset = HEADER_BYTES + table_len
+    for _ in range(count):
+        if version == 1:
+            message_id, length, label_len = struct.unpack_from(entry_format, table, cursor)
+            checksum = None
+        else:
+            message_id, length, checksum, label_len = struct.unpack_from(entry_format, table, cursor)
+        cursor += entry_bytes
+        label = table[cursor:cursor + label_len].decode('utf-8', errors='replace')
+        cursor += label_len
+        entries.append({"id": message_id, "label": label, "length": length, "offset": offset,
+                        "checksum": checksum})
+        offset += length
+    return entries
+
+def _read_message(flat: np.ndarray, entry: dict) -> bytes:
+    """Legge i byte di un messaggio e ne verifica il CRC32 (ValueError se non corrisponde)."""
+    body = _read_bytes(flat, entry["offset"], entry["length"])
+    checksum = StreamingChecksum()
+    checksum.update(body)
+    checksum.verify(entry["checksum"], f"il messaggio {entry['id']}")
+    return body
+
+# --- FUNZIONI PRINCIPALI ---
+
+def hideMessages(image_path: str, messages: list, output_path: str, carrier_cache=None, quality=False,
+                 verify=False):
+    """
+    Nasconde più messaggi indipendenti in un'unica immagine, in un solo passaggio.
+    messages è una lista di stringhe o di coppie (etichetta, testo); gli id sono 1..N.
+    Con quality=True, in caso di successo restituisce il report di qualità invece di True.
+    Con verify=True, prima di salvare, tabella e messaggi vengono riletti dall'array
+    in memoria e confrontati con gli originali e con i loro CRC32.
+    """
+    if not messages:
+        print("\nERRORE: Nessun messaggio da nascondere.")
+        return False
+    try:
+        carrier = CarrierBuffer.open(image_path, carrier_cache)
+        table, bodies = _build_table(messages)
+    except FileNotFoundError:
+        print(f"\nERRORE: Immagine '{image_path}' non trovata.")
+        return False
+    except OSError as e:
+        print(f"\nERRORE: Impossibile aprire l'immagine. Dettagli: {e}")
+        return False
+    except ValueError as e:
+        print(f"\nERRORE: {e}")
+        return False
+
+    payload = struct.pack(HEADER_FORMAT, MULTI_MAGIC, MULTI_VERSION, len(bodies), len(table)) + table + b"".join(bodies)
+    flat = carrier.flat
+    if len(payload) * 8 > len(flat):
+        print(f"\nERRORE: L'immagine è troppo piccola per contenere i messaggi.")
+        print(f"Spazio richiesto: {len(payload) * 8:,} bit ({len(payload):,} byte)")
+        print(f"Spazio disponibile: {len(flat):,} bit ({len(flat) // 8:,} byte)")
+        return False
+
+    # Solo il report di qualità ha bisogno di una seconda copia (l'originale da confrontare)
+    original = flat.copy() if quality else None
+    embed_lsb(flat, 0, bytes_to_bits(payload))
+
+    # Verifica facoltativa sull'array in memoria, senza decodificare il file salvato
+    if verify:
+        try:
+            verified = [_read_message(flat, entry) for entry in _read_table(flat)] == bodies
+        except (ValueError, struct.error):
+            verified = False
+        if not verified:
+            print("\nERRORE: Verifica fallita: i messaggi riletti non corrispondono.")
+            return False
+
+    carrier.save(output_path)
+    print(f"\nSUCCESSO: {len(bodies)} messaggi nascosti e immagine salvata in '{output_path}'.")
+    if quality:
+        return quality_report(original, flat, modified_end=len(payload) * 8)
+    return True
+
+def listMessages(image_path: str) -> list | None:
+    """Elenca i messaggi nascosti (id, etichetta, lunghezza in byte) leggendo solo la tabella."""
+    try:
+        entries = _read_table(CarrierBuffer.open(image_path).flat)
+    except FileNotFoundError:
+        print(f"\nERRORE: Immagine '{image_path}' non trovata.")
+        return None
+    except OSError as e:
+        print(f"\nERRORE: Impossibile aprire l'immagine. Dettagli: {e}")
+        return None
+    except (ValueError, struct.error) as e:
+        print(f"\nERRORE: {e}")
+        return None
+    return [{key: entry[key] for key in ("id", "label", "length")} for entry in entries]
+
+def getMessageById(image_path: str, message_id: int) -> str | None:
+    """Recupera un solo messaggio leggendo la tabella e i bit di quel messaggio."""
+    try:
+        flat = CarrierBuffer.open(image_path).flat
+        entries = _read_table(flat)
+    except FileNotFoundError:
+        print(f"\nERRORE: Immagine '{image_path}' non trovata.")
+        return None
+    except OSError as e:
+        print(f"\nERRORE: Impossibile aprire l'immagine. Dettagli: {e}")
+        return None
+    except (ValueError, struct.error) as e:
+        print(f"\nERRORE: {e}")
+        return None
+
+    for entry in entries:
+        if entry["id"] == message_id:
+            try:
+                return _read_message(flat, entry).decode('utf-8')
+            except (ValueError, UnicodeDecodeError) as e:
+                print(f"\nERRORE: Messaggio {message_id} corrotto: {e}")
+                return None
+    print(f"\nERRORE: Nessun messaggio con id {message_id}.")
+    return None
+
+# --- GESTIONE MENU E INPUT UTENTE ---
+
+def get_image_path(prompt: str) -> str:
+    """Chiede all'utente un percorso per un'immagine e controlla se esiste."""
+    while True:
+        path = input(prompt)
+        if os.path.exists(path):
+            return path
+        else:
+            print("ERRORE: File non trovato. Riprova.")
+
+def handle_hide_messages():
+    """Gestisce il flusso per nascondere più messaggi di testo."""
+    clear_screen()
+    print("--- Nascondi Più Messaggi di Testo in Immagine ---")
+    source_img = get_image_path("Percorso dell'immagine sorgente: ")
+
+    messages = []
+    print("\nInserisci i messaggi (riga vuota per terminare).")
+    while True:
+        text = input(f"Messaggio {len(messages) + 1}: ")
+        if not text:
+            break
+        label = input("  Etichetta (facoltativa): ")
+        messages.append((label, text))
+
+    if not messages:
+        print("ERRORE: nessun messaggio inserito.")
+        return
+
+    dir_name = os.path.dirname(source_img)
+    file_name, _ = os.path.splitext(os.path.basename(source_img))
+    output_img = os.path.join(dir_name, f"{file_name}_steg_multi.png")
+
+    print("\nInizio occultamento dei messaggi...")
+    report = hideMessages(source_img, messages, output_img, quality=True, verify=True)
+    if report:
+        print(f"\n{format_quality_report(report)}")
+
+def handle_recover_messages():
+    """Gestisce il flusso per elencare e recuperare i messaggi nascosti."""
+    clear_screen()
+    print("--- Recupera Messaggi di Testo da Immagine ---")
+    source_img = get_image_path("Percorso dell'immagine con i messaggi nascosti: ")
+
+    entries = listMessages(source_img)
+    if not entries:
+        return
+
+    print(f"\n{'ID':>4} | {'Byte':>8} | Etichetta")
+    for entry in entries:
+        print(f"{entry['id']:>4} | {entry['length']:>8,} | {entry['label']}")
+
+    try:
+        message_id = int(input("\nID del messaggio da leggere: "))
+    except ValueError:
+        print("ERRORE: ID non valido.")
+        return
+    message = getMessageById(source_img, message_id)
+    if message is not None:
+        print(f"\n{message}")
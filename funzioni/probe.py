@@ -0,0 +1,184 @@
+# Interrogazioni leggere sulle immagini: capacità e rilevamento del contenuto nascosto.
+# Questo modulo non deve importare NumPy: viene usato dagli script che invocano
+# il programma migliaia di volte, dove il tempo di import domina il lavoro utile.
+from utility import get_image_size
+from funzioni.checksum import parse_checksum_field
+
+# Costanti dei formati, da mantenere allineate con i rispettivi moduli.
+TEXT_TERMINATOR_BITS = 16             # text_in_image: terminatore di 16 zeri
+TEXT_CHECKSUM_BITS = 64               # text_in_image.TEXT_CHECKSUM_BITS (magic + CRC32 dopo il terminatore)
+IMAGE_METADATA_HEADER_MAX_BITS = 4096 # image_in_image.METADATA_HEADER_MAX_BITS
+FILE_METADATA_HEADER_MAX_BITS = 8192  # file_in_image.METADATA_HEADER_MAX_BITS
+METADATA_LEN_BITS = 16
+MULTI_TEXT_MAGIC = b"STGM"            # multi_text_in_image.MULTI_MAGIC
+
+# Numero massimo di byte di testo esaminati da probe() per riconoscere un messaggio.
+PROBE_TEXT_MAX_BYTES = 1024
+# Canali letti da probe(): abbastanza per l'header più grande e per la finestra di testo.
+PROBE_BITS = max(FILE_METADATA_HEADER_MAX_BITS, PROBE_TEXT_MAX_BYTES * 8 + TEXT_TERMINATOR_BITS)
+
+def get_capacity(image_path: str) -> dict:
+    """
+    Calcola la capacità dell'immagine per ogni tipo di contenuto leggendo solo
+    l'header del file (nessuna decodifica dei pixel).
+    """
+    width, height = get_image_size(image_path)
+    channels = width * height * 3
+
+    text_bits = max(channels - TEXT_TERMINATOR_BITS - TEXT_CHECKSUM_BITS, 0)
+    file_bits = max(channels - FILE_METADATA_HEADER_MAX_BITS, 0)
+
+    return {
+        "width": width,
+        "height": height,
+        "text_chars": text_bits // 8,
+        "file_bytes": file_bits // 8,
+        # Bit disponibili per l'immagine nascosta per ogni valore di LSB (1-8): solo i canali
+        # dopo l'header, a gruppi di 3 (image_in_image.fits_in_container)
+        "image_bits": {lsb: max(channels - IMAGE_METADATA_HEADER_MAX_BITS, 0) // 3 * 3 * lsb for lsb in range(1, 9)},
+    }
+
+def _limit_decoding(img, rows: int) -> bool:
+    """
+    Riduce un PNG non interlacciato, non ancora caricato, alle sue prime `rows` righe: il
+    decoder zlib si ferma appena l'immagine ridotta è piena e i restanti dati IDAT vengono
+    solo saltati. Gli altri formati (e i PNG interlacciati) restano interi e vengono
+    decodificati completamente da load(). Restituisce True se l'immagine è stata ridotta.
+    """
+    if img.format != "PNG" or img.info.get("interlace") or len(img.tile) != 1 or rows >= img.height:
+        return False
+    # Usa gli attributi interni _size e tile di PIL (verificato con Pillow 12.3): se cambiano,
+    # l'immagine resta intera e la lettura è solo più lenta.
+    size = img.size
+    try:
+        tile = img.tile[0]
+        tiles = [(tile[0], (0, 0, img.width, rows)) + tuple(tile[2:])]
+        img._size = (img.width, rows)
+    except (AttributeError, TypeError, IndexError):
+        return False
+    try:
+        img.tile = tiles
+    except (AttributeError, TypeError):
+        img._size = size
+        return False
+    return True
+
+def _read_lsb_prefix(image_path: str, n_channels: int) -> list:
+    """
+    Legge gli LSB dei primi n_channels canali RGB. Per i PNG non interlacciati decodifica
+    solo le righe necessarie; gli altri formati vengono decodificati per intero.
+    """
+    from PIL import Image
+
+    for limited in (True, False):
+        with Image.open(image_path) as img:
+            rows = min(img.height, -(-n_channels // (img.width * 3)))
+            try:
+                if limited and not _limit_decoding(img, rows):
+                    limited = False
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+                data = img.crop((0, 0, img.width, rows)).tobytes()
+            except Exception:
+                # La decodifica ridotta non è più compatibile con questo Pillow: si riprova
+                # decodificando tutta l'immagine (gli errori veri si ripresentano lì)
+                if not limited:
+                    raise
+                continue
+        return [byte & 1 for byte in data[:n_channels]]
+
+def _bits_to_bytes(bits: list) -> bytes:
+    """Converte una lista di bit (MSB first) in bytes."""
+    return bytes(
+        int(''.join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits) - len(bits) % 8, 8)
+    )
+
+def _parse_length_prefixed(bits: list, header_max_bits: int):
+    """Decodifica un header [lunghezza (16 bit)][dati UTF-8], None se non valido."""
+    length = int(''.join(map(str, bits[:METADATA_LEN_BITS])), 2)
+    if length == 0 or length * 8 + METADATA_LEN_BITS > header_max_bits:
+        return None
+    try:
+        return _bits_to_bytes(bits[METADATA_LEN_BITS:METADATA_LEN_BITS + length * 8]).decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+def _probe_image_metadata(bits: list):
+    """Riconosce l'header di image_in_image: 'w,h,lsb,msb,div'."""
+    metadata = _parse_length_prefixed(bits, IMAGE_METADATA_HEADER_MAX_BITS)
+    if metadata is None:
+        return None
+    parts = metadata.split(',')
+    if len(parts) < 5:
+        return None
+    try:
+        w, h, lsb, msb, div = int(parts[0]), int(parts[1]), int(parts[2]), int(parts[3]), float(parts[4])
+    except ValueError:
+        return None
+    if w <= 0 or h <= 0 or not (1 <= lsb <= 8 and 1 <= msb <= 8) or div <= 0:
+        return None
+    return {"type": "immagine", "w": w, "h": h, "lsb": lsb, "msb": msb, "div": div}
+
+def _probe_file_metadata(bits: list, capacity_bits: int):
+    """Riconosce l'header di file_in_image: 'nome,dimensione' con l'eventuale ',crc32=...'."""
+    metadata = _parse_length_prefixed(bits, FILE_METADATA_HEADER_MAX_BITS)
+    if metadata is None:
+        return None
+    head, _, last = metadata.rpartition(',')
+    if parse_checksum_field(last) is not None:
+        metadata = head
+    filename, _, filesize = metadata.rpartition(',')
+    if not filename or not filesize.isdigit():
+        return None
+    if int(filesize) * 8 + FILE_METADATA_HEADER_MAX_BITS > capacity_bits:
+        return None
+    return {"type": "file", "filename": filename, "filesize": int(filesize)}
+
+def _probe_multi_text(bits: list):
+    """Riconosce una raccolta di multi_text_in_image: magic, versione e numero di messaggi."""
+    header = _bits_to_bytes(bits[:88])
+    if header[:4] != MULTI_TEXT_MAGIC:
+        return None
+    return {"type": "messaggi", "count": int.from_bytes(header[5:7], 'big')}
+
+def _probe_text(bits: list):
+    """Riconosce un messaggio di text_in_image cercando il terminatore (allineato al byte) tra i primi bit."""
+    data = _bits_to_bytes(bits)
+    terminator_pos = data.find(b"\0" * (TEXT_TERMINATOR_BITS // 8))
+    if terminator_pos == 0:
+        return None
+    truncated = terminator_pos == -1
+    message_bytes = data[:terminator_pos] if not truncated else data[:PROBE_TEXT_MAX_BYTES]
+    try:
+        message = message_bytes.decode('utf-8', errors='strict' if not truncated else 'ignore')
+    except UnicodeDecodeError:
+        return None
+    # Il testo deve essere stampabile (a capo e tabulazioni ammessi)
+    if not message or not message.replace('\n', '').replace('\t', '').isprintable():
+        return None
+    # length None: il messaggio è più lungo della finestra esaminata
+    return {"type": "testo", "length": None if truncated else len(message)}
+
+def probe(image_path: str) -> dict:
+    """
+    Stima che tipo di contenuto è nascosto nell'immagine leggendo solo l'header.
+    Non importa NumPy e non decodifica il payload.
+    Restituisce un dizionario con almeno la chiave 'type' ('messaggi', 'immagine', 'file', 'testo' o None).
+    """
+    width, height = get_image_size(image_path)
+    capacity_bits = width * height * 3
+    bits = _read_lsb_prefix(image_path, min(capacity_bits, PROBE_BITS))
+    return probe_bits(bits, capacity_bits)
+
+def probe_bits(bits: list, capacity_bits: int) -> dict:
+    """
+    Come probe(), ma a partire dagli LSB già estratti (i primi PROBE_BITS canali RGB)
+    e dalla capacità totale in bit dell'immagine.
+    """
+    return (
+        _probe_multi_text(bits)
+        or _probe_image_metadata(bits)
+        or _probe_file_metadata(bits, capacity_bits)
+        or _probe_text(bits)
+        or {"type": None}
+    )
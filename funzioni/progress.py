@@ -0,0 +1,93 @@
+# Avanzamento e annullamento cooperativo per le operazioni lunghe.
+# Le funzioni di occultamento/recupero elaborano i dati a blocchi: tra un blocco
+# e l'altro chiamano ProgressReporter.update(), che notifica la callback e
+# controlla il token di annullamento.
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+class OperationCancelled(Exception):
+    """Sollevata quando un'operazione viene annullata tramite CancellationToken."""
+
+class CancellationToken:
+    """Token condiviso tra chi avvia un'operazione e chi può annullarla (anche da un altro thread)."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Richiede l'annullamento: l'operazione si fermerà al prossimo blocco."""
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """Solleva OperationCancelled se è stato richiesto l'annullamento."""
+        if self._event.is_set():
+            raise OperationCancelled("Operazione annullata.")
+
+class ProgressReporter:
+    """
+    Tiene traccia dei bit elaborati e notifica la callback con un dizionario:
+    {'bits_done', 'total_bits', 'percent', 'elapsed', 'eta'} (tempi in secondi,
+    eta None finché non è stimabile).
+    """
+
+    def __init__(self, total_bits: int, callback=None, cancel_token: CancellationToken = None):
+        self.total_bits = total_bits
+        self.callback = callback
+        self.cancel_token = cancel_token
+        self.bits_done = 0
+        self._start = time.perf_counter()
+
+    def update(self, bits: int):
+        """Registra altri `bits` elaborati, notifica la callback e controlla l'annullamento."""
+        self.bits_done += bits
+        if self.callback is not None:
+            elapsed = time.perf_counter() - self._start
+            done = min(self.bits_done, self.total_bits)
+            percent = 100.0 * done / self.total_bits if self.total_bits else 100.0
+            eta = elapsed * (self.total_bits - done) / done if done else None
+            self.callback({
+                "bits_done": done,
+                "total_bits": self.total_bits,
+                "percent": percent,
+                "elapsed": elapsed,
+                "eta": eta,
+            })
+        self.check()
+
+    def check(self):
+        """Solleva OperationCancelled se il token è stato annullato."""
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+
+def console_progress(info: dict):
+    """Callback che mostra una barra di avanzamento sulla stessa riga del terminale."""
+    width = 30
+    filled = int(width * info["percent"] / 100)
+    eta = f"{info['eta']:.1f}s" if info["eta"] is not None else "--"
+    sys.stderr.write(f"\r[{'#' * filled}{'.' * (width - filled)}] {info['percent']:5.1f}%  ETA {eta}   ")
+    if info["bits_done"] >= info["total_bits"]:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+@contextmanager
+def cancel_on_interrupt(token: CancellationToken):
+    """
+    Durante il blocco, Ctrl+C annulla il token invece di interrompere il processo:
+    l'operazione si ferma al blocco successivo senza lasciare file parziali.
+    """
+    import signal
+
+    if threading.current_thread() is not threading.main_thread():
+        yield token
+        return
+    previous = signal.signal(signal.SIGINT, lambda signum, frame: token.cancel())
+    try:
+        yield token
+    finally:
+        signal.signal(signal.SIGINT, previous)
@@ -0,0 +1,115 @@
+# Misure di qualità dell'occultamento calcolate in blocco con NumPy:
+# MSE/PSNR tra contenitore e risultato, frazione di canali modificati e
+# spostamento degli istogrammi (valori e LSB) per ogni canale RGB.
+import math
+import numpy as np
+
+# Oltre questo numero di canali le misure vengono stimate su un campione stratificato di blocchi,
+# così il costo resta trascurabile rispetto all'occultamento anche per immagini enormi.
+QUALITY_SAMPLE_CHANNELS = 1 << 20
+QUALITY_SAMPLE_BLOCKS = 512
+CHANNEL_NAMES = ("R", "G", "B")
+
+def _sample_region(carrier: np.ndarray, stego: np.ndarray, start: int, stop: int, max_channels: int,
+                   rng: np.random.Generator) -> tuple:
+    """
+    Canali [start, stop) da misurare (start e stop multipli di 3). Se sono più di max_channels
+    restituisce un blocco contiguo per ognuno di QUALITY_SAMPLE_BLOCKS strati di uguale
+    ampiezza, in posizione casuale nello strato: ogni zona della regione è rappresentata
+    e i blocchi non vanno in aliasing con i passi regolari di image_in_image.
+    Restituisce (prima, dopo, peso), dove peso è quanti canali reali rappresenta ognuno.
+    """
+    length = stop - start
+    if length <= max_channels:
+        return carrier[start:stop], stego[start:stop], 1.0
+    block = max(3, (max_channels // QUALITY_SAMPLE_BLOCKS) // 3 * 3)
+    n_blocks = max(1, max_channels // block)
+    stratum = length // n_blocks // 3 * 3
+    offsets = rng.integers(0, (stratum - block) // 3 + 1, n_blocks) * 3
+    starts = start + np.arange(n_blocks) * stratum + offsets
+    before = np.concatenate([carrier[s:s + block] for s in starts])
+    after = np.concatenate([stego[s:s + block] for s in starts])
+    return before, after, length / len(before)
+
+def quality_report(carrier: np.ndarray, stego: np.ndarray, max_channels: int = QUALITY_SAMPLE_CHANNELS,
+                   seed: int = 0, modified_end: int = None) -> dict:
+    """
+    Confronta l'immagine contenitore con quella risultante (immagini PIL RGB o array uint8,
+    piatti o (h, w, 3)).
+    modified_end è il primo canale dopo quelli scritti, per i formati che occupano un
+    prefisso contiguo (testo, file, più messaggi): il prefisso e il resto vengono misurati
+    separatamente, così un payload piccolo non sfugge al campione. Senza modified_end
+    l'immagine è un'unica regione.
+    Restituisce un dizionario con:
+      mse, psnr (dB, inf se identiche), changed_ratio (frazione di canali modificati),
+      channels: per R/G/B changed_ratio, lsb_ones_before/after, lsb_shift e histogram_delta
+      (distanza di variazione totale tra gli istogrammi a 256 valori, 0-1),
+      sampled/samples: se e su quanti canali è stato usato un campione.
+    """
+    carrier = np.asarray(carrier).reshape(-1)
+    stego = np.asarray(stego).reshape(-1)
+    if carrier.shape != stego.shape:
+        raise ValueError("Le immagini da confrontare hanno dimensioni diverse.")
+
+    total = len(carrier)
+    bounds = [0, total]
+    if modified_end is not None and 0 < modified_end < total:
+        # Confine arrotondato al pixel, così ogni regione inizia dal canale R
+        bounds.insert(1, min(-(-modified_end // 3) * 3, total))
+    rng = np.random.default_rng(seed)
+    regions = [_sample_region(carrier, stego, start, stop, max_channels, rng)
+               for start, stop in zip(bounds, bounds[1:]) if stop > start]
+    sampled = any(weight != 1.0 for _, _, weight in regions)
+
+    channels = {}
+    squared_error = 0.0
+    changed_total = 0.0
+    for c, name in enumerate(CHANNEL_NAMES):
+        n = changed = ones_before = ones_after = 0.0
+        hist_delta = np.zeros(256)
+        for before, after, weight in regions:
+            before_c, after_c = before[c::3], after[c::3]
+            diff = after_c.astype(np.int16) - before_c
+            squared_error += weight * int(np.einsum('i,i->', diff, diff, dtype=np.int64))
+            changed += weight * np.count_nonzero(diff)
+            ones_before += weight * np.count_nonzero(before_c & 1)
+            ones_after += weight * np.count_nonzero(after_c & 1)
+            hist_delta += weight * (np.bincount(after_c, minlength=256) - np.bincount(before_c, minlength=256))
+            n += weight * len(before_c)
+        changed_total += changed
+        n = max(n, 1)
+        channels[name] = {
+            "changed_ratio": changed / n,
+            "lsb_ones_before": ones_before / n,
+            "lsb_ones_after": ones_after / n,
+            "lsb_shift": (ones_after - ones_before) / n,
+            "histogram_delta": float(np.abs(hist_delta).sum() / (2 * n)),
+        }
+
+    mse = squared_error / total if total else 0.0
+    psnr = math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+    return {
+        "mse": mse,
+        "psnr": psnr,
+        "changed_ratio": changed_total / max(total, 1),
+        "channels": channels,
+        "sampled": sampled,
+        "samples": sum(len(before) for before, _, _ in regions),
+    }
+
+def format_quality_report(report: dict) -> str:
+    """Testo leggibile del report di qualità, per il menu e la riga di comando."""
+    psnr = "∞ (immagini identiche)" if math.isinf(report["psnr"]) else f"{report['psnr']:.2f} dB"
+    lines = [
+        "--- Qualità dell'immagine risultante ---",
+        f"PSNR: {psnr}   MSE: {report['mse']:.4f}",
+        f"Canali modificati: {report['changed_ratio'] * 100:.2f}%",
+    ]
+    for name, stats in report["channels"].items():
+        lines.append(f"  {name}: modificati {stats['changed_ratio'] * 100:.2f}%, "
+                     f"LSB a 1 {stats['lsb_ones_before'] * 100:.2f}% → {stats['lsb_ones_after'] * 100:.2f}%, "
+                     f"variazione istogramma {stats['histogram_delta'] * 100:.2f}%")
+    if report["sampled"]:
+        lines.append(f"(stima su un campione di {report['samples']:,} canali)")
+    return "\n".join(lines)
@@ -0,0 +1,250 @@
+# Analisi steganografica LSB: cerca payload nascosti anche in formati sconosciuti.
+# Per ogni immagine e per ogni canale RGB calcola, in modo vettoriale:
+#   - l'attacco chi-quadro di Westfeld-Pfitzmann sulle coppie di valori (2k, 2k+1),
+#     sull'intera immagine e su ogni regione di una griglia;
+#   - la stima del tasso di occultamento con Sample Pair Analysis (Dumitrescu-Wu-Wang)
+#     sulle coppie di pixel adiacenti, globale e per regione.
+# Entrambe le misure derivano da un'unica tabella dei conteggi delle coppie (u, v) per
+# regione, ottenuta con un solo bincount per blocco.
+# Gli LSB iniziali vengono anche confrontati con i formati di questo progetto (probe).
+# scan_directory() distribuisce i file su più processi e ordina i risultati per sospetto.
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+from funzioni.bitplane import extract_lsb
+from funzioni.probe import PROBE_BITS, probe_bits
+
+IMAGE_EXTENSIONS = (".png", ".bmp", ".tif", ".tiff", ".gif", ".webp", ".jpg", ".jpeg")
+# Griglia di regioni per le misure locali (righe x colonne).
+REGION_GRID = (4, 4)
+# Frequenza attesa minima perché una coppia di valori entri nel chi-quadro.
+CHI_SQUARE_MIN_EXPECTED = 5
+# Frazione minima di coppie "vicine" (u e v nella stessa coppia 2k, 2k+1) perché la stima
+# SPA sia affidabile: sotto questa soglia (immagini molto rumorose) l'equazione è mal
+# condizionata. La frazione non cambia con l'occultamento LSB, quindi dipende solo dal contenitore.
+SPA_MIN_CLOSE_PAIRS = 0.05
+# Per la scansione di directory si analizza una riga su SCAN_ROW_STEP: le statistiche
+# restano stabili e il costo dell'analisi si dimezza.
+SCAN_ROW_STEP = 2
+CHANNEL_NAMES = ("R", "G", "B")
+
+# --- FUNZIONI STATISTICHE ---
+
+def _regularized_gamma_q(a: float, x: float) -> float:
+    """Funzione gamma incompleta regolarizzata superiore Q(a, x) (serie / frazione continua)."""
+    if x <= 0:
+        return 1.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        # Serie per P(a, x)
+        term = total = 1.0 / a
+        n = a
+        for _ in range(1000):
+            n += 1
+            term *= x / n
+            total += term
+            if abs(term) < abs(total) * 1e-12:
+                break
+        return max(0.0, 1.0 - total * math.exp(log_prefix))
+    # Frazione continua di Lentz per Q(a, x)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-12:
+            break
+    return min(1.0, math.exp(log_prefix) * h)
+
+def chi_square_pairs(hist: np.ndarray) -> float:
+    """
+    Attacco chi-quadro sulle coppie di valori (2k, 2k+1) di un istogramma a 256 valori.
+    Restituisce la probabilità (0-1) che l'istogramma abbia le coppie livellate come
+    dopo un occultamento LSB: valori vicini a 1 indicano un probabile payload.
+    """
+    even = hist[0::2].astype(np.float64)
+    odd = hist[1::2].astype(np.float64)
+    expected = (even + odd) / 2
+    valid = expected >= CHI_SQUARE_MIN_EXPECTED
+    dof = int(np.count_nonzero(valid)) - 1
+    if dof < 1:
+        return 0.0
+    chi2 = float((((even[valid] - expected[valid]) ** 2) / expected[valid]).sum())
+    return _regularized_gamma_q(dof / 2, chi2 / 2)
+
+# Maschere sulla tabella delle coppie (u, v) per le classi di Sample Pair Analysis:
+# colonne X, Y, Z (u == v) e W (stessa coppia 2k, 2k+1 ma u != v), applicate con un solo prodotto matriciale.
+_U, _V = np.meshgrid(np.arange(256), np.arange(256), indexing='ij')
+_SPA_MASKS = np.stack([
+    ((_V % 2 == 0) & (_U < _V)) | ((_V % 2 == 1) & (_U > _V)),
+    ((_V % 2 == 0) & (_U > _V)) | ((_V % 2 == 1) & (_U < _V)),
+    _U == _V,
+    (_U >> 1 == _V >> 1) & (_U != _V),
+], axis=-1).reshape(-1, 4).astype(np.float64)
+del _U, _V
+
+def sample_pair_rates(pair_tables: np.ndarray) -> np.ndarray:
+    """
+    Stima del tasso di occultamento LSB (0-1) con Sample Pair Analysis per ogni tabella
+    256x256 dei conteggi delle coppie (u, v) di pixel adiacenti (array (..., 256, 256)).
+    Le stime non affidabili (vedi SPA_MIN_CLOSE_PAIRS) valgono NaN.
+    """
+    shape = pair_tables.shape[:-2]
+    counts = pair_tables.reshape(-1, 65536).astype(np.float64) @ _SPA_MASKS
+    return np.array([_spa_root(*row) for row in counts]).reshape(shape)
+
+def _spa_root(x: float, y: float, z: float, w: float) -> float:
+    """Radice dell'equazione SPA (W + Z)/2 * p^2 + (2X - P) * p + (Y - X) = 0 più vicina a zero."""
+    pairs = x + y + z # W è un sottoinsieme di Y
+    if pairs == 0 or (z + w) < SPA_MIN_CLOSE_PAIRS * pairs:
+        return math.nan
+    a = (w + z) / 2
+    b = 2 * x - pairs
+    c = y - x
+    if a == 0:
+        rate = -c / b if b else 0.0
+    else:
+        disc = b * b - 4 * a * c
+        if disc < 0:
+            # Nessuna radice reale: succede vicino a p = 1, si usa il vertice della parabola
+            rate = -b / (2 * a)
+        else:
+            roots = ((-b - math.sqrt(disc)) / (2 * a), (-b + math.sqrt(disc)) / (2 * a))
+            rate = min(roots, key=abs)
+    return float(min(max(rate, 0.0), 1.0))
+
+def pair_tables(channel: np.ndarray, grid=REGION_GRID, row_step: int = 1) -> np.ndarray:
+    """
+    Tabelle dei conteggi delle coppie orizzontali disgiunte (u, v) = (pixel 2i, pixel 2i+1)
+    per ogni regione della griglia: array (righe, colonne, 256, 256). Con row_step > 1
+    analizza una riga ogni row_step. Da ogni tabella si ricavano sia SPA sia l'istogramma
+    per il chi-quadro.
+    """
+    channel = np.ascontiguousarray(channel[::row_step])
+    height, width = channel.shape
+    rows, cols = grid
+    tables = np.zeros((rows, cols, 256 * 256), dtype=np.intp)
+    # Confini di colonna pari: ogni riga di una regione, vista come uint16 big-endian,
+    # è già la sequenza degli indici u * 256 + v, senza copie né calcoli sui pixel.
+    col_bounds = [width // 2 * k // cols * 2 for k in range(cols + 1)]
+    for r in range(rows):
+        band = channel[r * height // rows:(r + 1) * height // rows]
+        for k in range(cols):
+            block = band[:, col_bounds[k]:col_bounds[k + 1]]
+            if block.size:
+                tables[r, k] = np.bincount(block.view('>u2').reshape(-1), minlength=256 * 256)
+    return tables.reshape(rows, cols, 256, 256)
+
+def _nan_stat(func, values: np.ndarray) -> float:
+    """Applica func ai soli valori non NaN (NaN se non ce ne sono)."""
+    values = values[~np.isnan(values)]
+    return float(func(values)) if len(values) else math.nan
+
+# --- ANALISI DI UN'IMMAGINE ---
+
+def analyze_array(arr: np.ndarray, grid=REGION_GRID, row_step: int = 1) -> dict:
+    """
+    Analizza un array RGB (h, w, 3). Restituisce per ogni canale il chi-quadro e la
+    stima SPA globali e per regione (massimo e mediana; NaN se non affidabili), più un
+    punteggio di sospetto complessivo (0-1) e l'eventuale formato noto negli LSB iniziali.
+    """
+    channels = {}
+    for c, name in enumerate(CHANNEL_NAMES):
+        regions = pair_tables(arr[:, :, c], grid, row_step).reshape(-1, 256, 256)
+        total = regions.sum(axis=0)
+        region_rates = sample_pair_rates(regions)
+        channels[name] = {
+            "chi_square": chi_square_pairs(total.sum(axis=1)),
+            "chi_square_region_max": max(chi_square_pairs(t.sum(axis=1)) for t in regions),
+            "spa_rate": float(sample_pair_rates(total)),
+            "spa_rate_region_max": _nan_stat(np.max, region_rates),
+            "spa_rate_region_median": _nan_stat(np.median, region_rates),
+        }
+
+    flat = arr.reshape(-1)
+    known = probe_bits(extract_lsb(flat, 0, min(len(flat), PROBE_BITS)).tolist(), len(flat))
+
+    # SPA globale stima la frazione di LSB sostituiti; lo scarto tra la regione peggiore e
+    # la mediana delle regioni fa emergere i payload concentrati all'inizio dell'immagine
+    # (come nei formati LSB sequenziali) senza penalizzare le immagini uniformemente rumorose.
+    evidence = [0.0]
+    for ch in channels.values():
+        evidence.append(ch["spa_rate"])
+        evidence.append(ch["spa_rate_region_max"] - ch["spa_rate_region_median"])
+    score = max(value for value in evidence if not math.isnan(value))
+    if known["type"] is not None:
+        score = 1.0
+    return {"score": score, "known_format": known["type"], "channels": channels}
+
+def analyze_image(image_path: str, row_step: int = 1) -> dict:
+    """Analizza un file immagine; in caso di errore il risultato contiene la chiave 'error'."""
+    try:
+        with Image.open(image_path) as img:
+            arr = np.asarray(img.convert("RGB") if img.mode != "RGB" else img)
+        result = analyze_array(arr, row_step=row_step)
+        result.update({"path": image_path, "width": arr.shape[1], "height": arr.shape[0]})
+        return result
+    except Exception as e:
+        return {"path": image_path, "score": 0.0, "error": str(e)}
+
+# --- SCANSIONE DI DIRECTORY ---
+
+def find_images(directory: str, recursive: bool = True) -> list:
+    """Elenca i file immagine (per estensione) presenti nella directory."""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        found.extend(os.path.join(root, name) for name in sorted(files)
+                     if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not recursive:
+            break
+    return found
+
+def scan_directory(directory: str, processes: int = None, recursive: bool = True,
+                   row_step: int = SCAN_ROW_STEP) -> list:
+    """
+    Analizza tutte le immagini della directory usando più processi (default: tutti i core)
+    e restituisce i risultati ordinati dal più sospetto.
+    """
+    if not os.path.isdir(directory):
+        raise ValueError(f"Directory '{directory}' non trovata.")
+    paths = find_images(directory, recursive)
+    if not paths:
+        return []
+    analyze = partial(analyze_image, row_step=row_step)
+    if processes == 1 or len(paths) == 1:
+        results = [analyze(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(analyze, paths, chunksize=max(1, len(paths) // 64)))
+    return sorted(results, key=lambda r: r["score"], reverse=True)
+
+def format_scan_report(results: list, top: int = None) -> str:
+    """Tabella testuale dei risultati di scan_directory()."""
+    # Il chi-quadro non compare: sui contenitori puliti con istogrammi regolari vale quasi
+    # sempre ~1 come su quelli con payload, quindi non aiuta a ordinare i risultati.
+    lines = [f"{'Punteggio':>9} | {'SPA max':>7} | {'Formato':<9} | File"]
+    for result in results[:top]:
+        if "error" in result:
+            lines.append(f"{'-':>9} | {'-':>7} | {'errore':<9} | {result['path']} ({result['error']})")
+            continue
+        channels = result["channels"].values()
+        spa = _nan_stat(np.max, np.array([ch["spa_rate"] for ch in channels]))
+        spa = "n/d" if math.isnan(spa) else f"{spa:.3f}"
+        lines.append(f"{result['score']:>9.3f} | {spa:>7} | "
+                     f"{result['known_format'] or '-':<9} | {result['path']}")
+    return "\n".join(lines)
@@ -1,6 +1,17 @@
 import os
 from PIL import Image
 from utility import clear_screen
+from funzioni.checksum import StreamingChecksum
+
+# Dopo il terminatore di 16 zeri viene scritto il CRC32 del messaggio: [magic (4 byte)][CRC32 (4 byte)].
+# Le immagini create prima non hanno il magic e vengono lette come sempre, senza verifica.
+TEXT_TERMINATOR = "0000000000000000"
+TEXT_CHECKSUM_MAGIC = b"SC32"
+TEXT_CHECKSUM_BITS = 64
+# Canali letti per blocco durante la ricerca del terminatore (multiplo di 8).
+TEXT_READ_CHUNK = 1 << 16
+# Tabella per str.translate: ogni byte diventa la cifra '0' o '1' del suo LSB.
+_LSB_DIGITS = bytes(ord('0') + (value & 1) for value in range(256))
 
 # --- FUNZIONI DI CONVERSIONE E MANIPOLAZIONE DEI BIT ---
 
@@ -24,14 +35,59 @@ def setLastBit(value: int, bit: str) -> int:
     """Modifica l'ultimo bit (LSB) di un valore intero (0-255)."""
     return (value & 254) | int(bit)
 
+def _lsb_bytes(channels: bytes) -> bytes:
+    """Impacchetta gli LSB di una sequenza di canali (lunghezza multipla di 8) in bytes."""
+    if not channels:
+        return b""
+    return int(channels.translate(_LSB_DIGITS), 2).to_bytes(len(channels) // 8, 'big')
+
+def _extract_message(channels: bytes):
+    """
+    Legge a blocchi i byte nascosti nei canali RGB (es. img.tobytes()) fino al terminatore,
+    cercato solo su posizioni allineate al byte: un carattere che termina con bit a 0 non
+    può così essere scambiato per l'inizio del terminatore.
+    Restituisce (byte del messaggio, CRC32 del trailer o None) oppure None senza terminatore.
+    """
+    trailer_bytes = TEXT_CHECKSUM_BITS // 8
+    usable = len(channels) - len(channels) % 8
+    hidden = bytearray()
+    terminator_pos = -1
+    start = 0
+    while start < usable:
+        search_from = max(len(hidden) - 1, 0)
+        hidden += _lsb_bytes(channels[start:min(start + TEXT_READ_CHUNK, usable)])
+        start += TEXT_READ_CHUNK
+        if terminator_pos == -1:
+            terminator_pos = hidden.find(b"\0\0", search_from)
+        if terminator_pos != -1 and len(hidden) >= terminator_pos + 2 + trailer_bytes:
+            break
+    if terminator_pos == -1:
+        return None
+
+    trailer = hidden[terminator_pos + 2:terminator_pos + 2 + trailer_bytes]
+    checksum = None
+    if len(trailer) == trailer_bytes and trailer[:4] == TEXT_CHECKSUM_MAGIC:
+        checksum = int.from_bytes(trailer[4:], 'big')
+    return bytes(hidden[:terminator_pos]), checksum
+
 # --- FUNZIONI PRINCIPALI DI STEGANOGRAFIA ---
 
-def hideMessage(image_path: str, message: str, output_path: str) -> bool:
+def hideMessage(image_path: str, message: str, output_path: str, carrier_cache=None, quality=False,
+                verify=False):
     """
     Nasconde una stringa di testo all'interno di un'immagine.
+    Con carrier_cache (una CarrierCache) l'immagine decodificata viene copiata
+    dalla cache invece di essere riaperta e riconvertita.
+    Con quality=True, in caso di successo restituisce il report di qualità
+    (vedi funzioni.quality.quality_report) invece di True.
+    Con verify=True, prima di salvare, il messaggio viene riletto dall'immagine in memoria
+    e confrontato con l'originale e con il suo CRC32.
     """
     try:
-        img = Image.open(image_path)
+        if carrier_cache is not None:
+            img = Image.fromarray(carrier_cache.get(image_path))
+        else:
+            img = Image.open(image_path)
     except FileNotFoundError:
         print(f"\nERRORE: Immagine '{image_path}' non trovata.")
         return False
@@ -39,13 +95,16 @@ def hideMessage(image_path: str, message: str, output_path: str) -> bool:
         print(f"\nERRORE: Impossibile aprire l'immagine. Dettagli: {e}")
         return False
 
-    # Aggiunge un terminatore più robusto: 16 zeri consecutivi
-    binary_message = binaryConvert(message) + "0000000000000000"
+    # Aggiunge un terminatore più robusto (16 zeri consecutivi) seguito dal checksum
+    checksum = StreamingChecksum()
+    checksum.update(message.encode('utf-8'))
+    trailer = TEXT_CHECKSUM_MAGIC + checksum.value.to_bytes(4, 'big')
+    binary_message = binaryConvert(message) + TEXT_TERMINATOR + ''.join(format(byte, '08b') for byte in trailer)
     
     # Controlla se l'immagine è abbastanza grande
     max_bits = img.width * img.height * 3
     if len(binary_message) > max_bits:
-        available_chars = (max_bits - 16) // 8  # Sottrae il terminatore
+        available_chars = (max_bits - len(TEXT_TERMINATOR) - TEXT_CHECKSUM_BITS) // 8  # Sottrae terminatore e checksum
         message_chars = len(message)
         print(f"\nERRORE: L'immagine è troppo piccola per contenere il messaggio.")
         print(f"Spazio richiesto: {len(binary_message)} bit ({message_chars:,} caratteri)")
@@ -56,18 +115,19 @@ def hideMessage(image_path: str, message: str, output_path: str) -> bool:
     if img.mode != "RGB":
         img = img.convert("RGB")
 
-    img_copy = img.copy()
+    # L'immagine ricavata dalla cache è già una copia indipendente
+    img_copy = img if carrier_cache is not None else img.copy()
     pixels = img_copy.load()
     
     bit_index = 0
     
     for y in range(img.height):
+        if bit_index >= len(binary_message):
+            break
         for x in range(img.width):
             if bit_index >= len(binary_message):
                 # Tutti i bit sono stati nascosti
-                img_copy.save(output_path)
-                print(f"\nSUCCESSO: Messaggio nascosto e immagine salvata in '{output_path}'.")
-                return True
+                break
                 
             r, g, b = pixels[x, y]
             
@@ -87,15 +147,28 @@ def hideMessage(image_path: str, message: str, output_path: str) -> bool:
                 bit_index += 1
             
             pixels[x, y] = (r, g, b)
+
+    # Verifica facoltativa sull'immagine in memoria, senza decodificare il file salvato
+    if verify:
+        recovered = _extract_message(img_copy.tobytes())
+        if recovered is None or recovered != (message.encode('utf-8'), checksum.value):
+            print("\nERRORE: Verifica fallita: il messaggio riletto non corrisponde (contiene caratteri nulli?).")
+            return False
     
     img_copy.save(output_path)
     print(f"\nSUCCESSO: Messaggio nascosto e immagine salvata in '{output_path}'.")
+    if quality:
+        # Importato solo su richiesta: il resto del modulo non dipende da NumPy
+        from funzioni.quality import quality_report
+        carrier = carrier_cache.get(image_path) if carrier_cache is not None else img
+        return quality_report(carrier, img_copy, modified_end=len(binary_message))
     return True
 
 def getMessage(image_path: str) -> str | None:
     """
     Recupera un messaggio di testo nascosto da un'immagine.
-    Questa versione è più robusta: prima estrae tutti i bit, poi cerca il terminatore.
+    I bit vengono estratti a blocchi solo fino al terminatore; se dopo il terminatore
+    c'è il checksum, il messaggio viene verificato.
     """
     try:
         img = Image.open(image_path)
@@ -109,29 +182,23 @@ def getMessage(image_path: str) -> str | None:
     if img.mode != "RGB":
         img = img.convert("RGB")
         
-    pixels = img.load()
+    # 1. Estrai i byte nascosti fino al terminatore (allineato al byte)
+    recovered = _extract_message(img.tobytes())
     
-    # 1. Estrai tutti i bit LSB dall'immagine in un'unica stringa
-    extracted_bits_list = []
-    for y in range(img.height):
-        for x in range(img.width):
-            r, g, b = pixels[x, y]
-            extracted_bits_list.append(format(r, '08b')[-1])
-            extracted_bits_list.append(format(g, '08b')[-1])
-            extracted_bits_list.append(format(b, '08b')[-1])
-    
-    all_bits = "".join(extracted_bits_list)
-    
-    # 2. Cerca il terminatore del messaggio
-    terminator = "0000000000000000"
-    terminator_pos = all_bits.find(terminator)
-    
-    if terminator_pos != -1:
-        # 3. Trovato! Prendi tutti i bit *prima* del terminatore
-        message_bits = all_bits[:terminator_pos]
-        
-        # 4. Converti i bit del messaggio in testo
-        message = binaryConvertBack(message_bits)
+    if recovered is not None:
+        message_bytes, expected_checksum = recovered
+
+        # 2. Se presente, verifica il checksum scritto dopo il terminatore
+        checksum = StreamingChecksum()
+        checksum.update(message_bytes)
+        try:
+            checksum.verify(expected_checksum, "il messaggio")
+        except ValueError as e:
+            print(f"\nERRORE: {e}")
+            return None
+
+        # 3. Converti i byte del messaggio in testo
+        message = message_bytes.decode('utf-8', errors='ignore')
         
         if message:
             return message
@@ -139,7 +206,7 @@ def getMessage(image_path: str) -> str | None:
             print("\nERRORE: Dati trovati ma impossibili da decodificare in testo (potrebbe essere un file binario).")
             return None
     else:
-        # 5. Se il terminatore non viene trovato, non c'è nessun messaggio nascosto.
+        # 4. Se il terminatore non viene trovato, non c'è nessun messaggio nascosto.
         print("\nERRORE: Nessun messaggio (o terminatore di messaggio) trovato nell'immagine.")
         return None
 
@@ -193,7 +260,10 @@ def handle_hide_text():
     output_img = os.path.join(dir_name, f"{file_name}_steg.png")
     
     print("\nInizio occultamento del messaggio...")
-    hideMessage(source_img, message, output_img)
+    report = hideMessage(source_img, message, output_img, quality=True, verify=True)
+    if report:
+        from funzioni.quality import format_quality_report
+        print(f"\n{format_quality_report(report)}")
 
 def handle_recover_text():
     """Gestisce il flusso per recuperare una stringa di testo."""
@@ -242,9 +312,8 @@ def calculate_text_capacity(image_path: str):
         # Calcola la capacità totale in bit (3 canali RGB × 1 bit LSB per canale)
         total_bits = img.width * img.height * 3
         
-        # Sottrae i bit per il terminatore (16 bit = "0000000000000000")
-        terminator_bits = 16
-        available_bits = total_bits - terminator_bits
+        # Sottrae i bit per il terminatore (16 bit = "0000000000000000") e il checksum
+        available_bits = total_bits - len(TEXT_TERMINATOR) - TEXT_CHECKSUM_BITS
         
         # Ogni carattere UTF-8 può occupare da 1 a 4 byte (8-32 bit)
         # Per essere sicuri, calcoliamo basandoci su caratteri a 1 byte (8 bit)
@@ -1,10 +1,11 @@
-# Script per la steganografia testuale con menu interattivo.
-# Permette di nascondere e recuperare stringhe di testo da immagini.
-from funzioni.text_in_image import handle_hide_text, handle_recover_text
+# Script per la steganografia su immagini con menu interattivo e comandi per script.
+# Permette di nascondere e recuperare testo, immagini e file generici.
+#
+# I moduli di funzioni/ vengono importati solo quando servono: image_in_image e
+# file_in_image caricano NumPy e PIL, che da soli costano più dell'avvio dell'interprete.
+# I comandi 'capacity' e 'probe' non importano NumPy.
+import sys
 from utility import clear_screen
-from funzioni.image_in_image import handle_hide_image, handle_recover_image
-# --- NUOVA IMPORTAZIONE ---
-from funzioni.file_in_image import handle_hide_file, handle_recover_file
 
 # --- GESTIONE MENU E INPUT UTENTE ---
 
@@ -17,7 +18,13 @@ def sub_menu(action: str):
         print("2) Immagine")
         # --- NUOVA OPZIONE ---
         print("3) File generico")
-        print("4) Torna indietro")
+        print("4) Più messaggi di testo")
+        # L'anteprima ha senso solo in fase di recupero
+        preview = action == "Recuperare"
+        if preview:
+            print("5) Anteprima di un'immagine nascosta")
+        back = '6' if preview else '5'
+        print(f"{back}) Torna indietro")
         choice = input("Scegli un'opzione: ")
 
         if choice == '1':
@@ -28,6 +35,10 @@ def sub_menu(action: str):
         elif choice == '3':
             return 3
         elif choice == '4':
+            return 4
+        elif choice == '5' and preview:
+            return 5
+        elif choice == back:
             return None # Per tornare indietro
         else:
             print("Scelta non valida. Riprova.")
@@ -47,19 +58,34 @@ def main_menu():
         if main_choice == '1':
             sub_choice = sub_menu("Nascondere")
             if sub_choice == 1:
+                from funzioni.text_in_image import handle_hide_text
                 handle_hide_text()
             elif sub_choice == 2:
+                from funzioni.image_in_image import handle_hide_image
                 handle_hide_image()
             elif sub_choice == 3:
+                from funzioni.file_in_image import handle_hide_file
                 handle_hide_file()
+            elif sub_choice == 4:
+                from funzioni.multi_text_in_image import handle_hide_messages
+                handle_hide_messages()
         elif main_choice == '2':
             sub_choice = sub_menu("Recuperare")
             if sub_choice == 1:
+                from funzioni.text_in_image import handle_recover_text
                 handle_recover_text()
             elif sub_choice == 2:
+                from funzioni.image_in_image import handle_recover_image
                 handle_recover_image()
             elif sub_choice == 3:
+                from funzioni.file_in_image import handle_recover_file
                 handle_recover_file()
+            elif sub_choice == 4:
+                from funzioni.multi_text_in_image import handle_recover_messages
+                handle_recover_messages()
+            elif sub_choice == 5:
+                from funzioni.image_in_image import handle_preview_image
+                handle_preview_image()
         elif main_choice == '3':
             clear_screen()
             break
@@ -70,5 +96,259 @@ def main_menu():
         if main_choice in ['1', '2']:
             input("\nPremi Invio per tornare al menu principale...")
 
+# --- COMANDI NON INTERATTIVI (per script) ---
+
+def cmd_capacity(args) -> int:
+    """Stampa la capacità dell'immagine leggendo solo l'header del file."""
+    from funzioni.probe import get_capacity
+    cap = get_capacity(args.image)
+    print(f"dimensioni: {cap['width']}x{cap['height']}")
+    print(f"testo: {cap['text_chars']} caratteri")
+    print(f"file: {cap['file_bytes']} byte")
+    for lsb, bits in cap['image_bits'].items():
+        print(f"immagine lsb={lsb}: {bits} bit")
+    return 0
+
+def cmd_probe(args) -> int:
+    """Stampa il tipo di contenuto che sembra nascosto nell'immagine."""
+    from funzioni.probe import probe
+    result = probe(args.image)
+    if result["type"] is None:
+        print("nessun contenuto riconosciuto")
+        return 1
+    print(' '.join(f"{key}={value}" for key, value in result.items()))
+    return 0
+
+def _print_quality(args, report):
+    """Con --quality stampa il report di qualità restituito dalla funzione di occultamento."""
+    if args.quality and report:
+        from funzioni.quality import format_quality_report
+        print(format_quality_report(report))
+
+def cmd_hide_text(args) -> int:
+    from funzioni.text_in_image import hideMessage
+    result = hideMessage(args.image, args.message, args.output, quality=args.quality, verify=args.verify)
+    _print_quality(args, result)
+    return 0 if result else 1
+
+def cmd_recover_text(args) -> int:
+    from funzioni.text_in_image import getMessage
+    message = getMessage(args.image)
+    if message is None:
+        return 1
+    print(message)
+    return 0
+
+def cmd_hide_messages(args) -> int:
+    from funzioni.multi_text_in_image import hideMessages
+    labels = args.label or []
+    if len(labels) > len(args.messages):
+        print("ERRORE: più etichette che messaggi.", file=sys.stderr)
+        return 1
+    labels += [""] * (len(args.messages) - len(labels))
+    result = hideMessages(args.image, list(zip(labels, args.messages)), args.output, quality=args.quality,
+                          verify=args.verify)
+    _print_quality(args, result)
+    return 0 if result else 1
+
+def cmd_list_messages(args) -> int:
+    from funzioni.multi_text_in_image import listMessages
+    entries = listMessages(args.image)
+    if entries is None:
+        return 1
+    for entry in entries:
+        print(f"{entry['id']}\t{entry['length']}\t{entry['label']}")
+    return 0
+
+def cmd_get_message(args) -> int:
+    from funzioni.multi_text_in_image import getMessageById
+    message = getMessageById(args.image, args.id)
+    if message is None:
+        return 1
+    print(message)
+    return 0
+
+def _progress_options(args) -> dict:
+    """Callback di avanzamento (con --progress) e token annullato da Ctrl+C / SIGTERM."""
+    import signal
+    from funzioni.progress import CancellationToken, console_progress
+
+    token = CancellationToken()
+    signal.signal(signal.SIGINT, lambda signum, frame: token.cancel())
+    signal.signal(signal.SIGTERM, lambda signum, frame: token.cancel())
+    return {"progress": console_progress if args.progress else None, "cancel_token": token}
+
+def cmd_hide_image(args) -> int:
+    from PIL import Image
+    from funzioni.image_in_image import hideImage, hideImageFitted, format_fit_plan, PLAN_MIN_PSNR
+    secret = Image.open(args.secret)
+    if args.fit:
+        min_psnr = PLAN_MIN_PSNR if args.min_psnr is None else args.min_psnr
+        plan = hideImageFitted(args.container, secret, args.output, min_psnr, args.max_seconds,
+                               quality=args.quality, verify=args.verify, **_progress_options(args))
+        print(format_fit_plan(plan, secret.size))
+        _print_quality(args, plan.get("quality"))
+        # Codice 3: immagine salvata, ma oltre la durata richiesta da --max-seconds
+        return 0 if plan["within_time"] else 3
+    report = hideImage(Image.open(args.container), secret, args.output, args.lsb, args.msb,
+                       quality=args.quality, verify=args.verify, **_progress_options(args))
+    _print_quality(args, report)
+    return 0
+
+def cmd_recover_image(args) -> int:
+    from PIL import Image
+    from funzioni.image_in_image import getImage
+    getImage(Image.open(args.image), args.output, **_progress_options(args))
+    return 0
+
+def cmd_preview_image(args) -> int:
+    from PIL import Image
+    from funzioni.image_in_image import getImagePreview
+    preview = getImagePreview(Image.open(args.image), args.output, step=args.step, bits=args.bits)
+    print(f"{preview.width}x{preview.height}")
+    return 0
+
+def cmd_hide_file(args) -> int:
+    from funzioni.file_in_image import hideFile
+    report = hideFile(args.image, args.file, args.output, quality=args.quality, verify=args.verify,
+                      **_progress_options(args))
+    _print_quality(args, report)
+    return 0
+
+def cmd_recover_file(args) -> int:
+    from funzioni.file_in_image import recoverFile
+    print(recoverFile(args.image, args.output_dir, **_progress_options(args)))
+    return 0
+
+def cmd_scan(args) -> int:
+    from funzioni.steganalysis import SCAN_ROW_STEP, format_scan_report, scan_directory
+    results = scan_directory(args.directory, processes=args.processes, recursive=not args.no_recursive,
+                             row_step=args.row_step or SCAN_ROW_STEP)
+    if not results:
+        print("Nessuna immagine trovata.")
+        return 0
+    print(format_scan_report(results, args.top))
+    return 0
+
+def build_parser():
+    """Costruisce il parser dei comandi non interattivi."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Steganografia su immagini. Senza argomenti avvia il menu interattivo.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("capacity", help="capacità dell'immagine (non decodifica i pixel)")
+    p.add_argument("image")
+    p.set_defaults(func=cmd_capacity)
+
+    p = commands.add_parser("probe", help="rileva il tipo di contenuto nascosto (non importa NumPy)")
+    p.add_argument("image")
+    p.set_defaults(func=cmd_probe)
+
+    p = commands.add_parser("hide-text", help="nasconde una stringa di testo")
+    p.add_argument("image")
+    p.add_argument("message")
+    p.add_argument("output")
+    p.add_argument("--quality", action="store_true", help="stampa PSNR, canali modificati e variazione degli istogrammi")
+    p.add_argument("--verify", action="store_true", help="rilegge il contenuto dall'immagine in memoria prima di salvarla")
+    p.set_defaults(func=cmd_hide_text)
+
+    p = commands.add_parser("recover-text", help="recupera una stringa di testo")
+    p.add_argument("image")
+    p.set_defaults(func=cmd_recover_text)
+
+    p = commands.add_parser("hide-messages", help="nasconde più messaggi di testo in un solo passaggio")
+    p.add_argument("image")
+    p.add_argument("output")
+    p.add_argument("messages", nargs="+")
+    p.add_argument("--label", action="append", help="etichetta del messaggio corrispondente (ripetibile, in ordine)")
+    p.add_argument("--quality", action="store_true", help="stampa PSNR, canali modificati e variazione degli istogrammi")
+    p.add_argument("--verify", action="store_true", help="rilegge il contenuto dall'immagine in memoria prima di salvarla")
+    p.set_defaults(func=cmd_hide_messages)
+
+    p = commands.add_parser("list-messages", help="elenca i messaggi nascosti (legge solo la tabella)")
+    p.add_argument("image")
+    p.set_defaults(func=cmd_list_messages)
+
+    p = commands.add_parser("get-message", help="recupera un messaggio per id")
+    p.add_argument("image")
+    p.add_argument("id", type=int)
+    p.set_defaults(func=cmd_get_message)
+
+    p = commands.add_parser("hide-image", help="nasconde un'immagine in un'altra")
+    p.add_argument("container")
+    p.add_argument("secret")
+    p.add_argument("output")
+    p.add_argument("--lsb", type=int, default=4)
+    p.add_argument("--msb", type=int, default=4)
+    p.add_argument("--fit", action="store_true",
+                   help="sceglie risoluzione dell'immagine segreta, lsb e msb (ignora --lsb e --msb)")
+    p.add_argument("--min-psnr", type=float, default=None,
+                   help="con --fit: PSNR minimo del contenitore in dB (default 40)")
+    p.add_argument("--max-seconds", type=float, default=None, help="con --fit: durata massima stimata (codice di uscita 3 se non rispettabile)")
+    p.add_argument("--progress", action="store_true", help="mostra l'avanzamento su stderr")
+    p.add_argument("--quality", action="store_true", help="stampa PSNR, canali modificati e variazione degli istogrammi")
+    p.add_argument("--verify", action="store_true", help="rilegge il contenuto dall'immagine in memoria prima di salvarla")
+    p.set_defaults(func=cmd_hide_image, cancellable=True)
+
+    p = commands.add_parser("recover-image", help="recupera un'immagine nascosta")
+    p.add_argument("image")
+    p.add_argument("output")
+    p.add_argument("--progress", action="store_true", help="mostra l'avanzamento su stderr")
+    p.set_defaults(func=cmd_recover_image, cancellable=True)
+
+    p = commands.add_parser("preview-image", help="anteprima a bassa risoluzione dell'immagine nascosta")
+    p.add_argument("image")
+    p.add_argument("output")
+    p.add_argument("--step", type=int, default=4, help="una riga e una colonna ogni STEP (default 4)")
+    p.add_argument("--bits", type=int, default=None, help="legge solo i BITS bit più significativi")
+    p.set_defaults(func=cmd_preview_image)
+
+    p = commands.add_parser("hide-file", help="nasconde un file generico")
+    p.add_argument("image")
+    p.add_argument("file")
+    p.add_argument("output")
+    p.add_argument("--progress", action="store_true", help="mostra l'avanzamento su stderr")
+    p.add_argument("--quality", action="store_true", help="stampa PSNR, canali modificati e variazione degli istogrammi")
+    p.add_argument("--verify", action="store_true", help="rilegge il contenuto dall'immagine in memoria prima di salvarla")
+    p.set_defaults(func=cmd_hide_file, cancellable=True)
+
+    p = commands.add_parser("recover-file", help="recupera un file nascosto")
+    p.add_argument("image")
+    p.add_argument("output_dir", nargs="?", default=".")
+    p.add_argument("--progress", action="store_true", help="mostra l'avanzamento su stderr")
+    p.set_defaults(func=cmd_recover_file, cancellable=True)
+
+    p = commands.add_parser("scan", help="analisi steganografica LSB di tutte le immagini di una directory")
+    p.add_argument("directory")
+    p.add_argument("--processes", type=int, default=None, help="numero di processi (default: tutti i core)")
+    p.add_argument("--top", type=int, default=None, help="mostra solo i TOP file più sospetti")
+    p.add_argument("--row-step", type=int, default=None, help="analizza una riga ogni ROW_STEP (default 2)")
+    p.add_argument("--no-recursive", action="store_true", help="non analizza le sottodirectory")
+    p.set_defaults(func=cmd_scan)
+
+    return parser
+
+def main(argv=None) -> int:
+    """Entry point: menu interattivo senza argomenti, altrimenti esegue un comando."""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        main_menu()
+        return 0
+
+    args = build_parser().parse_args(argv)
+    # Solo i comandi lunghi importano funzioni.progress (capacity/probe restano leggeri)
+    cancelled_error = ()
+    if getattr(args, "cancellable", False):
+        from funzioni.progress import OperationCancelled as cancelled_error
+    try:
+        return args.func(args)
+    except cancelled_error:
+        print("Operazione annullata.", file=sys.stderr)
+        return 130
+    except (ValueError, OSError) as e:
+        print(f"ERRORE: {e}", file=sys.stderr)
+        return 1
+
 if __name__ == "__main__":
-    main_menu()
\ No newline at end of file
+    sys.exit(main())
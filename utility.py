@@ -0,0 +1,106 @@
+import os
+import struct
+
+def clear_screen():
+    """Pulisce il terminale (Windows: cls, Unix: clear)."""
+    os.system('cls' if os.name == 'nt' else 'clear')
+
+def _png_size(header: bytes):
+    """Legge le dimensioni dal chunk IHDR di un PNG."""
+    if header[:8] == b'\x89PNG\r\n\x1a\n' and header[12:16] == b'IHDR':
+        return struct.unpack('>II', header[16:24])
+    return None
+
+def _gif_size(header: bytes):
+    """Legge le dimensioni dal Logical Screen Descriptor di un GIF."""
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', header[6:10])
+    return None
+
+def _bmp_size(header: bytes):
+    """Legge le dimensioni dal BITMAPINFOHEADER di un BMP."""
+    if header[:2] == b'BM' and len(header) >= 26:
+        width, height = struct.unpack('<ii', header[18:26])
+        return width, abs(height)
+    return None
+
+def _jpeg_size(f):
+    """Scorre i marker JPEG fino al primo SOFn e ne legge le dimensioni."""
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            data = f.read(7)
+            height, width = struct.unpack('>HH', data[3:7])
+            return width, height
+        segment_len = struct.unpack('>H', f.read(2))[0]
+        f.seek(segment_len - 2, os.SEEK_CUR)
+
+def get_image_size(path: str):
+    """
+    Restituisce (larghezza, altezza) di un'immagine leggendo solo l'header del file.
+    Evita di importare PIL per i formati più comuni (PNG, GIF, BMP, JPEG);
+    per gli altri formati ripiega su PIL, che comunque non decodifica i pixel.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(32)
+        size = _png_size(header) or _gif_size(header) or _bmp_size(header)
+        if size is None and header[:2] == b'\xff\xd8':
+            size = _jpeg_size(f)
+    if size is not None:
+        return size
+
+    from PIL import Image
+    with Image.open(path) as img:
+        return img.size
+
+def _temp_path(path: str) -> str:
+    """Percorso temporaneo nella stessa cartella di path (per un rename atomico)."""
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+
+def save_image_atomic(img, path: str, cancel_token=None):
+    """
+    Salva un'immagine PIL passando da un file temporaneo: se il salvataggio fallisce
+    o viene interrotto non rimane un file di output parziale. cancel_token (un
+    CancellationToken) viene controllato subito prima di rinominare il temporaneo.
+    """
+    from PIL import Image
+
+    ext = os.path.splitext(path)[1].lower()
+    image_format = Image.registered_extensions().get(ext, "PNG")
+    tmp_path = _temp_path(path)
+    try:
+        img.save(tmp_path, format=image_format)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class AtomicWriter:
+    """
+    Context manager per scrivere un file binario a blocchi: il file finale compare
+    solo se il blocco termina senza eccezioni, altrimenti il temporaneo viene eliminato.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = _temp_path(path)
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.tmp_path, 'wb')
+        return self._file
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        elif os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        return False